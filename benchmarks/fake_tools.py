@@ -0,0 +1,143 @@
+"""Stand-ins for the external programs the pic tools shell out to.
+
+:func:`install` writes small ``exiftags``, ``jhead``, ``exiftran``,
+``convert`` and ``geeqie`` executables into a directory that the
+benchmarks put first on ``PATH``.  Each one sleeps for a configurable
+latency and then does just enough of the real tool's job for the pic
+tools to carry on: ``exiftags`` and ``jhead`` report what the synthetic
+EXIF header says, ``exiftran`` and ``convert`` copy their input to their
+output, and ``geeqie`` does nothing.
+
+The latency is read at run time from ``PIC_FAKE_LATENCY_<TOOL>`` (e.g.
+``PIC_FAKE_LATENCY_JHEAD``), falling back to ``PIC_FAKE_LATENCY`` and
+then to the value given to :func:`install`.  It is on top of the
+interpreter start-up cost of the stand-in itself.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+TOOLS = ("exiftags", "jhead", "exiftran", "convert", "geeqie")
+
+_WRAPPER = """#!{python} -S
+import sys
+sys.path.insert(0, {here!r})
+import fake_tools
+sys.exit(fake_tools.main({tool!r}, sys.argv[1:], {latency!r}))
+"""
+
+
+def install(dest: Path, latency: float = 0.0) -> Dict[str, Path]:
+    """Write the stand-in tools into *dest* and return their paths."""
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    here = str(Path(__file__).resolve().parent)
+    paths = {}
+    for tool in TOOLS:
+        path = dest / tool
+        path.write_text(
+            _WRAPPER.format(
+                python=sys.executable, here=here, tool=tool, latency=latency
+            )
+        )
+        path.chmod(0o755)
+        paths[tool] = path
+    return paths
+
+
+def _latency(tool: str, default: float) -> float:
+    for name in (f"PIC_FAKE_LATENCY_{tool.upper()}", "PIC_FAKE_LATENCY"):
+        value = os.environ.get(name)
+        if value:
+            return float(value)
+    return default
+
+
+def _exif(path: str):
+    import synthlib
+
+    with open(path, "rb") as f_in:
+        return synthlib.read_exif(f_in.read(65536))
+
+
+def _exiftags(args: List[str]) -> int:
+    import synthlib
+
+    path = args[-1]
+    try:
+        tags = _exif(path)
+    except (OSError, ValueError, IndexError) as err:
+        print(f"exiftags: {path}: {err}", file=sys.stderr)
+        return 1
+    created = tags.get(synthlib.TAG_DATETIME_ORIGINAL)
+    if created is None:
+        print(f"exiftags: {path}: couldn't find Exif data", file=sys.stderr)
+        return 1
+    sep = ":" if "-s:" in args else ""
+    print(f"Camera-Specific Properties{sep}")
+    print()
+    print(f"Equipment Make{sep} {tags.get(synthlib.TAG_MAKE, '')}")
+    print(f"Camera Model{sep} {tags.get(synthlib.TAG_MODEL, '')}")
+    print(f"Image Created{sep} {created}")
+    return 0
+
+
+def _jhead(args: List[str]) -> int:
+    import synthlib
+
+    for path in args:
+        try:
+            tags = _exif(path)
+        except (OSError, ValueError, IndexError) as err:
+            print(f"jhead: {path}: {err}", file=sys.stderr)
+            return 1
+        print(f"File name    : {path}")
+        print(f"File size    : {os.path.getsize(path)} bytes")
+        if synthlib.TAG_DATETIME_ORIGINAL in tags:
+            print(f"Date/Time    : {tags[synthlib.TAG_DATETIME_ORIGINAL]}")
+        orientation = tags.get(synthlib.TAG_ORIENTATION, 1)
+        if orientation != 1:
+            print(f"Orientation  : rotate {orientation}")
+        print()
+    return 0
+
+
+def _exiftran(args: List[str]) -> int:
+    # exiftran -a SRC -o DEST
+    dest = args[args.index("-o") + 1]
+    sources = [a for a in args if not a.startswith("-") and a != dest]
+    shutil.copyfile(sources[-1], dest)
+    return 0
+
+
+def _convert(args: List[str]) -> int:
+    # convert [options] SRC [FORMAT:]DEST
+    dest = args[-1].split(":", 1)[-1]
+    shutil.copyfile(args[-2], dest)
+    return 0
+
+
+def _geeqie(args: List[str]) -> int:
+    return 0
+
+
+_HANDLERS = {
+    "exiftags": _exiftags,
+    "jhead": _jhead,
+    "exiftran": _exiftran,
+    "convert": _convert,
+    "geeqie": _geeqie,
+}
+
+
+def main(tool: str, args: List[str], latency: float = 0.0) -> int:
+    delay = _latency(tool, latency)
+    if delay > 0:
+        time.sleep(delay)
+    return _HANDLERS[tool](args)
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""Time the pic tools against a synthetic library.
+
+Each benchmark builds a fresh synthetic library (see :mod:`synthlib`) in
+a scratch directory, puts the stand-in external tools (see
+:mod:`fake_tools`) first on ``PATH``, and times one operation.  Setup is
+never timed.  Every benchmark runs ``--repeat`` times for timing and
+once more under :mod:`tracemalloc` for peak Python memory; benchmarks
+that run a child process report that child's peak RSS instead.
+Benchmarks that write a site also report the files and bytes written.
+
+Results are written as JSON so that runs can be compared:
+
+    benchmarks/run.py --output before.json
+    ... change something ...
+    benchmarks/run.py --output after.json --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict
+
+HERE = Path(__file__).resolve().parent
+REPO = HERE.parent
+BIN = REPO / "bin"
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(BIN))
+
+import fake_tools  # noqa: E402
+import pic_trace  # noqa: E402
+import synthlib  # noqa: E402
+
+RESULT_VERSION = 1
+
+# name -> setup function.  A setup function receives the parsed
+# arguments and a scratch directory, prepares whatever it needs there
+# and returns the zero-argument callable to time, or a pair of that
+# callable and one to call afterwards to clean up.  For a child_process
+# benchmark the callable returns the child's peak RSS in KiB (see
+# run_child).
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+class Skip(Exception):
+    """Raised by a setup function when its benchmark cannot run here."""
+
+
+def benchmark(
+    name: str, child_process: bool = False, outputs: str | None = None
+):
+    """Register a setup function.
+
+    *outputs* names a directory, relative to the scratch directory,
+    whose files are counted after the run.
+    """
+
+    def register(setup):
+        setup.child_process = child_process
+        setup.outputs = outputs
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def run_child(cmd) -> int:
+    """Run *cmd* to completion and return its peak RSS in KiB.
+
+    The child is reaped with :func:`os.wait4` so that its own resource
+    usage is measured, rather than the largest child this process has
+    ever waited for.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return usage.ru_maxrss
+
+
+def load_script(name: str, path: Path):
+    """Import a script whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _Screen:
+    """Enough of a curses window for ``ImageFiles`` to draw on."""
+
+    def clear(self):
+        pass
+
+    def addstr(self, *args):
+        pass
+
+
+@benchmark("rename_files")
+def setup_rename_files(args, scratch: Path):
+    import pic_new
+
+    lib = synthlib.make_library(
+        scratch, args.count, xmp_size=args.xmp_size, seed=args.seed
+    )
+    files = [str(p) for p in lib.jpegs]
+    return lambda: pic_new.rename_files(files)
+
+
+@benchmark("time_shift_images")
+def setup_time_shift_images(args, scratch: Path):
+    import pic_mod
+
+    lib = synthlib.make_library(
+        scratch,
+        args.count,
+        canonical=True,
+        xmp_size=args.xmp_size,
+        seed=args.seed,
+    )
+    files = [p.name for p in lib.jpegs]
+
+    def run():
+        # time_shift_images globs relative to the current directory.
+        # Shift backwards so that no new name collides with an old one.
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        try:
+            pic_mod.time_shift_images(files, -24, False)
+        finally:
+            os.chdir(cwd)
+
+    return run
+
+
+@benchmark("get_rating_from_xmp")
+def setup_get_rating_from_xmp(args, scratch: Path):
+    pic_xmp = load_script("pic_xmp", BIN / "pic-xmp.py")
+    lib = synthlib.make_library(
+        scratch,
+        args.count,
+        canonical=True,
+        xmp_size=args.xmp_size,
+        seed=args.seed,
+    )
+    sidecars = list(lib.sidecars)
+    return lambda: [pic_xmp.get_rating_from_xmp(p) for p in sidecars]
+
+
+@benchmark("image_files")
+def setup_image_files(args, scratch: Path):
+    import pic_select
+
+    lib = synthlib.make_library(
+        scratch,
+        args.count,
+        canonical=True,
+        xmp_size=args.xmp_size,
+        seed=args.seed,
+    )
+    selection = scratch / "best.txt"
+    pic_select.write_file(str(selection), [str(p) for p in lib.jpegs])
+
+    def run():
+        screen = _Screen()
+        images = pic_select.ImageFiles()
+        images.read(str(selection))
+        actions = [
+            images.next_image,
+            images.accept_image,
+            images.reject_image,
+            images.previous_image,
+            images.delete_raw_image_future,
+            images.accept_image,
+            images.delete_image_future,
+        ]
+        step = 0
+        while images.main:
+            actions[step % len(actions)](screen)
+            step += 1
+        images.write()
+
+    return run
+
+
+@benchmark("apply_ratings")
+def setup_apply_ratings(args, scratch: Path):
+    import pic_rate
+
+    lib = synthlib.make_library(
+        scratch,
+        args.count,
+        canonical=True,
+        xmp_size=args.xmp_size,
+        seed=args.seed,
+    )
+    wanted = {str(p): 5 if i % 2 else -1 for i, p in enumerate(lib.jpegs)}
+    return lambda: pic_rate.apply_ratings(wanted)
+
+
+def _perl_ok() -> str | None:
+    """Return why pic-essay cannot run here, or ``None`` if it can."""
+    if shutil.which("perl") is None:
+        return "perl not found"
+    probe = subprocess.run(
+        ["perl", "-MDigest::SHA", "-MDate::Parse", "-e", "1"],
+        capture_output=True,
+        text=True,
+    )
+    if probe.returncode != 0:
+        return probe.stderr.strip().splitlines()[0]
+    return None
+
+
+@benchmark("pic_essay", child_process=True)
+def setup_pic_essay(args, scratch: Path):
+    reason = _perl_ok()
+    if reason:
+        raise Skip(reason)
+    lib = synthlib.make_library(
+        scratch / "in",
+        args.count,
+        canonical=True,
+        xmp_size=args.xmp_size,
+        seed=args.seed,
+    )
+    out = scratch / "out"
+    out.mkdir()
+    cmd = [
+        "perl",
+        str(BIN / "pic-essay"),
+        "--quiet",
+        "--output",
+        str(out),
+    ] + [str(p) for p in lib.jpegs]
+    return lambda: run_child(cmd)
+
+
+def _essay(args, scratch: Path, sprites: bool):
+    """Return a callable that freezes an index page of the library."""
+    import pic_gallery
+
+    lib = synthlib.make_library(
+        scratch / "in",
+        args.count,
+        canonical=True,
+        image_size=(640, 480),
+        xmp_size=args.xmp_size,
+        seed=args.seed,
+    )
+    essay = pic_gallery.Essay(
+        [str(p) for p in lib.jpegs],
+        index_name="index.html",
+        input_dir=str(scratch / "in"),
+        output_dir=str(scratch / "out"),
+        link_size="0",
+        sprites=sprites,
+    )
+    return lambda: essay.freeze(quiet=True)
+
+
+@benchmark("essay_thumbnails", outputs="out")
+def setup_essay_thumbnails(args, scratch: Path):
+    return _essay(args, scratch, sprites=False)
+
+
+@benchmark("essay_sprites", outputs="out")
+def setup_essay_sprites(args, scratch: Path):
+    try:
+        import numpy  # noqa: F401
+        import PIL  # noqa: F401
+    except ImportError as err:
+        raise Skip(str(err))
+    return _essay(args, scratch, sprites=True)
+
+
+def _pic_loop(args, scratch: Path, command, env=None):
+    """Return a callable that runs ``pic COMMAND`` once per invocation."""
+    synthlib.make_library(
+        scratch,
+        min(args.count, 50),
+        canonical=True,
+        xmp_size=args.xmp_size,
+        seed=args.seed,
+    )
+    cmd = [sys.executable, str(BIN / "pic")] + command
+    full_env = dict(os.environ)
+    full_env.pop("PIC_SERVER", None)
+    full_env.update(env or {})
+
+    def run():
+        for _ in range(args.invocations):
+            subprocess.run(
+                cmd,
+                cwd=scratch,
+                env=full_env,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+
+    return run
+
+
+def _pic_server(scratch: Path):
+    """Start ``pic serve`` in *scratch*; return (socket, stop callable)."""
+    sock = scratch / "pic.sock"
+    server = subprocess.Popen(
+        [sys.executable, str(BIN / "pic"), "serve", "--socket", str(sock)],
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while not sock.exists():
+        if time.monotonic() > deadline or server.poll() is not None:
+            server.kill()
+            raise Skip("pic serve did not start")
+        time.sleep(0.01)
+
+    def stop():
+        server.terminate()
+        server.wait()
+
+    return str(sock), stop
+
+
+@benchmark("startup_help_cold")
+def setup_startup_help_cold(args, scratch: Path):
+    return _pic_loop(args, scratch, ["--help"])
+
+
+@benchmark("startup_xmp_cold")
+def setup_startup_xmp_cold(args, scratch: Path):
+    return _pic_loop(args, scratch, ["xmp", "5"])
+
+
+@benchmark("startup_xmp_warm")
+def setup_startup_xmp_warm(args, scratch: Path):
+    sock, stop = _pic_server(scratch)
+    return _pic_loop(args, scratch, ["xmp", "5"], {"PIC_SERVER": sock}), stop
+
+
+def summarise(times):
+    return {
+        "times": times,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def _prepare(setup, args, scratch: Path):
+    """Run *setup*; return the callable to time and a cleanup callable."""
+    prepared = setup(args, scratch)
+    if isinstance(prepared, tuple):
+        return prepared
+    return prepared, lambda: None
+
+
+def run_one(name: str, args) -> dict:
+    setup = BENCHMARKS[name]
+    times = []
+    result: dict = {}
+    try:
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as tmp:
+                func, cleanup = _prepare(setup, args, Path(tmp))
+                gc.collect()
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        start = time.perf_counter()
+                        func()
+                        times.append(time.perf_counter() - start)
+                finally:
+                    cleanup()
+        with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as tmp:
+            func, cleanup = _prepare(setup, args, Path(tmp))
+            gc.collect()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if setup.child_process:
+                        result["peak_child_rss_kib"] = func()
+                    else:
+                        tracemalloc.start()
+                        func()
+                        _, peak = tracemalloc.get_traced_memory()
+                        tracemalloc.stop()
+                        result["peak_memory_bytes"] = peak
+                if setup.outputs:
+                    written = [
+                        p
+                        for p in (Path(tmp) / setup.outputs).rglob("*")
+                        if p.is_file()
+                    ]
+                    result["output_files"] = len(written)
+                    result["output_bytes"] = sum(
+                        p.stat().st_size for p in written
+                    )
+            finally:
+                cleanup()
+    except Skip as err:
+        return {"skipped": str(err)}
+    result.update(summarise(times))
+    return result
+
+
+def compare(old: dict, new: dict) -> None:
+    print(f"{'benchmark':<22} {'before':>10} {'after':>10} {'ratio':>7}")
+    for name, after in new["benchmarks"].items():
+        before = old.get("benchmarks", {}).get(name)
+        if not before or "median" not in before or "median" not in after:
+            continue
+        ratio = after["median"] / before["median"] if before["median"] else 0
+        print(
+            f"{name:<22} {before['median']:>10.4f} "
+            f"{after['median']:>10.4f} {ratio:>7.2f}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pic tools on a synthetic library."
+    )
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help="Benchmarks to run (default: all of {})".format(
+            ", ".join(BENCHMARKS)
+        ),
+    )
+    parser.add_argument(
+        "--count", type=int, default=200, help="Photos in the library"
+    )
+    parser.add_argument(
+        "--xmp-size",
+        type=int,
+        default=8192,
+        help="Approximate size of each XMP sidecar in bytes",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Extra seconds each stand-in external tool sleeps",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs per benchmark"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for the synthetic library"
+    )
+    parser.add_argument(
+        "--invocations",
+        type=int,
+        default=20,
+        help="Commands run back to back by the startup benchmarks",
+    )
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument(
+        "--compare", help="Compare against an earlier JSON results file"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Also record the tools' per-stage spans to FILE ('-' for stderr)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pic_trace.setup(args.profile)
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        sys.exit("Unknown benchmark(s): " + ", ".join(unknown))
+
+    with tempfile.TemporaryDirectory(prefix="bench-tools-") as tools:
+        fake_tools.install(Path(tools), latency=args.latency)
+        os.environ["PATH"] = tools + os.pathsep + os.environ.get("PATH", "")
+        results = {
+            "version": RESULT_VERSION,
+            "meta": {
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "params": {
+                    "count": args.count,
+                    "xmp_size": args.xmp_size,
+                    "latency": args.latency,
+                    "repeat": args.repeat,
+                    "seed": args.seed,
+                    "invocations": args.invocations,
+                },
+            },
+            "benchmarks": {},
+        }
+        for name in names:
+            result = run_one(name, args)
+            results["benchmarks"][name] = result
+            if "skipped" in result:
+                print(f"{name:<22} skipped: {result['skipped']}")
+            else:
+                files = ""
+                if "output_files" in result:
+                    files = f" {result['output_files']} files"
+                print(
+                    f"{name:<22} median {result['median']:.4f}s "
+                    f"min {result['min']:.4f}s{files}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f_out:
+            json.dump(results, f_out, indent=2)
+            f_out.write("\n")
+    if args.compare:
+        with open(args.compare) as f_in:
+            compare(json.load(f_in), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""Generate a synthetic photo library for the benchmarks.
+
+The library mimics what comes off a card or out of darktable: small but
+genuine baseline JPEGs carrying a real EXIF header (TIFF IFD0 plus an
+Exif sub-IFD with the three timestamps), RAW placeholders of a
+configurable size, and darktable-style XMP sidecars padded with history
+entries up to a configurable size.
+
+Only the standard library is used so the generator works wherever the
+tools themselves do.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import struct
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+# TIFF tags written into the synthetic EXIF header.
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_ORIENTATION = 0x0112
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+
+TYPE_ASCII = 2
+TYPE_SHORT = 3
+TYPE_LONG = 4
+
+EXIF_TIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+# Standard JPEG luminance DC table (ITU T.81, table K.3).
+_DC_BITS = [0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+_DC_VALS = list(range(12))
+# The synthetic images never code AC coefficients, so the AC table only
+# needs the end-of-block symbol.
+_AC_BITS = [1] + [0] * 15
+_AC_VALS = [0x00]
+
+
+def _huffman_codes(bits: Sequence[int], vals: Sequence[int]) -> Dict[int, tuple]:
+    """Return ``{symbol: (code, length)}`` for a canonical Huffman table."""
+    codes = {}
+    code = 0
+    k = 0
+    for length in range(1, 17):
+        for _ in range(bits[length - 1]):
+            codes[vals[k]] = (code, length)
+            code += 1
+            k += 1
+        code <<= 1
+    return codes
+
+
+class _BitWriter:
+    """Accumulate entropy-coded bits with JPEG byte stuffing."""
+
+    def __init__(self):
+        self.out = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value: int, length: int) -> None:
+        self.acc = (self.acc << length) | (value & ((1 << length) - 1))
+        self.nbits += length
+        while self.nbits >= 8:
+            self.nbits -= 8
+            byte = (self.acc >> self.nbits) & 0xFF
+            self.out.append(byte)
+            if byte == 0xFF:
+                self.out.append(0x00)
+        self.acc &= (1 << self.nbits) - 1
+
+    def flush(self) -> bytes:
+        if self.nbits:
+            self.write((1 << (8 - self.nbits)) - 1, 8 - self.nbits)
+        return bytes(self.out)
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return struct.pack(">HH", 0xFF00 | marker, len(payload) + 2) + payload
+
+
+def _ifd(entries, offset: int, next_ifd: int, bo: str) -> bytes:
+    """Serialise one IFD placed at *offset* within the TIFF block.
+
+    *entries* is a list of ``(tag, type, count, payload)`` tuples sorted
+    by tag.  Payloads longer than four bytes go in a data area directly
+    after the entry table.
+    """
+    table_len = 2 + 12 * len(entries) + 4
+    data_offset = offset + table_len
+    table = bytearray(struct.pack(bo + "H", len(entries)))
+    data = bytearray()
+    for tag, typ, count, payload in entries:
+        if len(payload) <= 4:
+            value = payload.ljust(4, b"\0")
+        else:
+            value = struct.pack(bo + "I", data_offset + len(data))
+            data += payload
+            if len(data) % 2:
+                data += b"\0"
+        table += struct.pack(bo + "HHI", tag, typ, count) + value
+    table += struct.pack(bo + "I", next_ifd)
+    return bytes(table + data)
+
+
+def build_exif(
+    when: datetime,
+    orientation: int = 1,
+    byteorder: str = "<",
+    make: str = "Synthetic",
+    model: str = "Bench 1",
+) -> bytes:
+    """Return an APP1 payload (``Exif\\0\\0`` + TIFF) describing *when*.
+
+    *byteorder* is ``"<"`` for Intel (``II``) or ``">"`` for Motorola
+    (``MM``) layout.
+    """
+    bo = byteorder
+    stamp = when.strftime(EXIF_TIME_FORMAT).encode("ascii") + b"\0"
+
+    def ascii_entry(tag, text):
+        raw = text if isinstance(text, bytes) else text.encode("ascii") + b"\0"
+        return (tag, TYPE_ASCII, len(raw), raw)
+
+    def ifd0(exif_offset):
+        return [
+            ascii_entry(TAG_MAKE, make),
+            ascii_entry(TAG_MODEL, model),
+            (TAG_ORIENTATION, TYPE_SHORT, 1, struct.pack(bo + "H", orientation)),
+            ascii_entry(TAG_DATETIME, stamp),
+            (TAG_EXIF_IFD, TYPE_LONG, 1, struct.pack(bo + "I", exif_offset)),
+        ]
+
+    exif_ifd = [
+        ascii_entry(TAG_DATETIME_ORIGINAL, stamp),
+        ascii_entry(TAG_DATETIME_DIGITIZED, stamp),
+    ]
+    ifd0_len = len(_ifd(ifd0(0), 8, 0, bo))
+    exif_offset = 8 + ifd0_len
+    tiff = (b"II" if bo == "<" else b"MM") + struct.pack(bo + "HI", 42, 8)
+    tiff += _ifd(ifd0(exif_offset), 8, 0, bo)
+    tiff += _ifd(exif_ifd, exif_offset, 0, bo)
+    return b"Exif\0\0" + tiff
+
+
+def encode_jpeg(
+    width: int, height: int, seed: int = 0, exif: bytes | None = None
+) -> bytes:
+    """Return a baseline greyscale JPEG of flat 8x8 blocks.
+
+    Each block gets its own grey level (derived from *seed*), which is
+    enough to give every synthetic photo a distinct, decodable picture
+    while only ever coding DC coefficients.
+    """
+    dc_codes = _huffman_codes(_DC_BITS, _DC_VALS)
+    ac_codes = _huffman_codes(_AC_BITS, _AC_VALS)
+    eob_code, eob_len = ac_codes[0x00]
+
+    writer = _BitWriter()
+    previous = 0
+    for by in range((height + 7) // 8):
+        for bx in range((width + 7) // 8):
+            level = (seed * 37 + bx * 11 + by * 7) % 200 + 28
+            # With an all-ones quantisation table the DC coefficient of
+            # a flat block is eight times its level-shifted value.
+            dc = 8 * (level - 128)
+            diff = dc - previous
+            previous = dc
+            category = abs(diff).bit_length()
+            code, length = dc_codes[category]
+            writer.write(code, length)
+            if category:
+                writer.write(diff if diff > 0 else diff - 1, category)
+            writer.write(eob_code, eob_len)
+    scan = writer.flush()
+
+    out = bytearray(b"\xff\xd8")
+    if exif is not None:
+        out += _segment(0xE1, exif)
+    out += _segment(0xDB, b"\x00" + b"\x01" * 64)
+    out += _segment(0xC0, struct.pack(">BHHBBBB", 8, height, width, 1, 1, 0x11, 0))
+    out += _segment(0xC4, b"\x00" + bytes(_DC_BITS) + bytes(_DC_VALS))
+    out += _segment(0xC4, b"\x10" + bytes(_AC_BITS) + bytes(_AC_VALS))
+    out += _segment(0xDA, bytes([1, 1, 0x00, 0, 63, 0]))
+    out += scan
+    out += b"\xff\xd9"
+    return bytes(out)
+
+
+def read_exif(data: bytes) -> Dict[int, object]:
+    """Return the IFD0 and Exif sub-IFD tags found in JPEG *data*.
+
+    ASCII values are returned as ``str`` and numeric values as ``int``.
+    Only what the synthetic library writes is understood; this is not a
+    general EXIF parser.
+    """
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        (length,) = struct.unpack(">H", data[pos + 2 : pos + 4])
+        if marker == 0xE1 and data[pos + 4 : pos + 10] == b"Exif\0\0":
+            return _read_tiff(data[pos + 10 : pos + 2 + length])
+        if marker == 0xDA:
+            break
+        pos += 2 + length
+    return {}
+
+
+def _read_tiff(tiff: bytes) -> Dict[int, object]:
+    bo = "<" if tiff[:2] == b"II" else ">"
+    tags: Dict[int, object] = {}
+    (offset,) = struct.unpack(bo + "I", tiff[4:8])
+    pending = [offset]
+    while pending:
+        offset = pending.pop()
+        (count,) = struct.unpack(bo + "H", tiff[offset : offset + 2])
+        for i in range(count):
+            entry = tiff[offset + 2 + 12 * i : offset + 14 + 12 * i]
+            tag, typ, n = struct.unpack(bo + "HHI", entry[:8])
+            if typ == TYPE_ASCII:
+                if n <= 4:
+                    raw = entry[8 : 8 + n]
+                else:
+                    (where,) = struct.unpack(bo + "I", entry[8:12])
+                    raw = tiff[where : where + n]
+                tags[tag] = raw.rstrip(b"\0").decode("ascii", "replace")
+            elif typ == TYPE_SHORT:
+                (tags[tag],) = struct.unpack(bo + "H", entry[8:10])
+            elif typ == TYPE_LONG:
+                (tags[tag],) = struct.unpack(bo + "I", entry[8:12])
+            if tag == TAG_EXIF_IFD:
+                pending.append(tags[tag])
+    return tags
+
+
+DARKTABLE_XMP_HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="XMP Core 4.4.0-Exiv2">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:exif="http://ns.adobe.com/exif/1.0/"
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:xmpMM="http://ns.adobe.com/xap/1.0/mm/"
+    xmlns:darktable="http://darktable.sf.net/"
+   exif:DateTimeOriginal="{taken}"
+   xmp:Rating="{rating}"
+   xmpMM:DerivedFrom="{derived}"
+   darktable:import_timestamp="{imported}"
+   darktable:change_timestamp="-1"
+   darktable:export_timestamp="-1"
+   darktable:print_timestamp="-1"
+   darktable:xmp_version="5"
+   darktable:raw_params="0"
+   darktable:auto_presets_applied="1"
+   darktable:history_end="{history_end}">
+   <darktable:history>
+    <rdf:Seq>
+"""
+
+DARKTABLE_XMP_ITEM = """     <rdf:li
+      darktable:num="{num}"
+      darktable:operation="{operation}"
+      darktable:enabled="1"
+      darktable:modversion="6"
+      darktable:params="{params}"
+      darktable:multi_name=""
+      darktable:multi_priority="0"
+      darktable:blendop_version="13"
+      darktable:blendop_params="gz11eJxjYGBgkGAAgRNODGiAEV0AJ2iwh+CRyscOAAdeGQQ="/>
+"""
+
+DARKTABLE_XMP_TAIL = """    </rdf:Seq>
+   </darktable:history>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+"""
+
+_OPERATIONS = ["exposure", "temperature", "filmicrgb", "colorin", "sharpen"]
+
+
+def darktable_xmp(
+    derived: str,
+    taken: datetime,
+    rating: int,
+    size: int = 4096,
+    rng: random.Random | None = None,
+) -> str:
+    """Return a darktable-style sidecar of roughly *size* bytes."""
+    rng = rng or random.Random(0)
+    head_args = dict(
+        taken=taken.strftime(EXIF_TIME_FORMAT) + ".000",
+        rating=rating,
+        derived=derived,
+        imported=int(taken.timestamp()) * 1000000,
+    )
+    items: List[str] = []
+    length = len(DARKTABLE_XMP_HEAD) + len(DARKTABLE_XMP_TAIL) + 40
+    while length < size or not items:
+        item = DARKTABLE_XMP_ITEM.format(
+            num=len(items),
+            operation=_OPERATIONS[len(items) % len(_OPERATIONS)],
+            params="".join(rng.choice("0123456789abcdef") for _ in range(64)),
+        )
+        items.append(item)
+        length += len(item)
+    head = DARKTABLE_XMP_HEAD.format(history_end=len(items), **head_args)
+    return head + "".join(items) + DARKTABLE_XMP_TAIL
+
+
+@dataclass
+class Library:
+    """What :func:`make_library` created, for the benchmarks to use."""
+
+    root: Path
+    jpegs: List[Path] = field(default_factory=list)
+    raws: List[Path] = field(default_factory=list)
+    sidecars: List[Path] = field(default_factory=list)
+    taken: Dict[Path, datetime] = field(default_factory=dict)
+
+    def all_files(self) -> List[Path]:
+        return self.jpegs + self.raws + self.sidecars
+
+
+def make_library(
+    root: Path,
+    count: int = 100,
+    canonical: bool = False,
+    raw_fraction: float = 0.5,
+    raw_size: int = 64 * 1024,
+    xmp_size: int = 4096,
+    rotated_fraction: float = 0.25,
+    image_size: tuple = (64, 48),
+    start: datetime = datetime(2020, 1, 2, 3, 4, 5),
+    step: timedelta = timedelta(seconds=3),
+    byteorder: str = "<",
+    seed: int = 0,
+) -> Library:
+    """Populate *root* with *count* photos and return a :class:`Library`.
+
+    With ``canonical=False`` the files look as they come off a camera
+    (``IMG_0001.JPG``, ``IMG_0001.CR2``, ``IMG_0001.JPG.xmp``), which is
+    what ``pic_new`` consumes.  With ``canonical=True`` they are named
+    the way ``pic_new`` leaves them (``20200102-030405-0001.jpg``,
+    ``.raf`` and ``.raf.xmp``), which is what the later tools consume.
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    lib = Library(root=root)
+    width, height = image_size
+    for i in range(count):
+        taken = start + step * i
+        seq = f"{i + 1:04d}"
+        if canonical:
+            base = f"{taken:%Y%m%d-%H%M%S}-{seq}"
+            jpg = root / f"{base}.jpg"
+            raw = root / f"{base}.raf"
+        else:
+            jpg = root / f"IMG_{seq}.JPG"
+            raw = root / f"IMG_{seq}.CR2"
+        orientation = 6 if rng.random() < rotated_fraction else 1
+        exif = build_exif(taken, orientation=orientation, byteorder=byteorder)
+        jpg.write_bytes(encode_jpeg(width, height, seed=seed + i, exif=exif))
+        lib.jpegs.append(jpg)
+        lib.taken[jpg] = taken
+
+        described = jpg
+        if rng.random() < raw_fraction:
+            raw.write_bytes(os.urandom(raw_size))
+            lib.raws.append(raw)
+            described = raw
+        sidecar = described.with_name(described.name + ".xmp")
+        sidecar.write_text(
+            darktable_xmp(
+                described.name, taken, rng.randint(-1, 5), xmp_size, rng
+            )
+        )
+        lib.sidecars.append(sidecar)
+    return lib
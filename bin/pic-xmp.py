@@ -6,6 +6,8 @@ import sys
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
+import pic_trace
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -27,6 +29,7 @@ def parse_args():
         dest="file_pattern",
         help="Optional regex to match the photo filename (e.g. '^20250411-' or 'jpg').",
     )
+    pic_trace.add_argument(parser)
     return parser.parse_args()
 
 
@@ -82,7 +85,8 @@ def get_rating_from_xmp(xmp_path: Path):
     Returns an int rating or None if not found / parse error.
     """
     try:
-        tree = ET.parse(xmp_path)
+        with pic_trace.span("xmp-parse", path=str(xmp_path)):
+            tree = ET.parse(xmp_path)
         root = tree.getroot()
     except ET.ParseError:
         return None
@@ -123,6 +127,7 @@ def get_rating_from_xmp(xmp_path: Path):
 
 def main():
     args = parse_args()
+    pic_trace.setup(args.profile)
     wanted_ratings = parse_ratings(args.ratings)
 
     file_pattern = None
@@ -135,7 +140,10 @@ def main():
 
     cwd = Path(os.getcwd())
 
-    for xmp_path in cwd.glob("*.xmp"):
+    with pic_trace.span("glob", path=str(cwd)):
+        xmp_paths = list(cwd.glob("*.xmp"))
+
+    for xmp_path in xmp_paths:
         # Derive the corresponding photo filename first,
         # e.g. 20250411-111016-3393.raf.xmp -> 20250411-111016-3393.raf
         photo_path = xmp_path.with_suffix("")
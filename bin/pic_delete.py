@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""Carry out pic_select's delete decisions.
+
+pic_select records ``d`` (delete the RAW, keep the JPEG) in the
+``-delete-raw`` file and ``D`` (delete the image altogether) in the
+``-delete`` file next to the selection.  This module turns those lists
+into files to remove:
+
+* for ``d``, the RAW of the image (``x.raf``, ``x.cr2``), its sidecar
+  (``x.raf.xmp``) and ufraw's ID file (``x.ufraw``);
+* for ``D``, everything named after the image: the JPEG and its
+  sidecar, ``x.jpg.orig`` backups, the RAW files above and developed
+  copies such as ``x-2.jpg``.  Deleting a developed copy itself removes
+  only that copy and its sidecar.
+
+Siblings can be shared: ``x.raf`` is the source of both ``x.jpg`` and
+``x-2.jpg``.  A file is never removed while an image that is being
+kept still needs it, so ``D`` on ``x.jpg`` leaves ``x.raf`` alone if
+``x-2.jpg`` was accepted; such files are reported as kept.
+
+Each directory is listed once and every sibling is resolved from that
+listing, so a network mount sees one directory read rather than a glob
+or a stat per candidate.  Removal then runs as one batch per directory
+(``unlinkat``, or ``renameat`` into ``--trash``, against a single open
+directory handle) from a small pool of threads.  The decision lists
+themselves are left as they are.
+"""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import pic_files
+import pic_trace
+
+RAW_KINDS = {ext.lstrip(".").lower() for ext in pic_files.RAW_EXTENSIONS}
+RAW_KINDS.add("ufraw")
+DEVELOPED_RE = re.compile(r"^(.+)-\d$")
+
+
+@dataclass
+class Plan:
+    """What :func:`plan` decided to remove, batched by directory."""
+
+    batches: Dict[Path, List[Tuple[str, int]]] = field(default_factory=dict)
+    kept: List[Path] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+
+    @property
+    def files(self) -> int:
+        return sum(len(batch) for batch in self.batches.values())
+
+    @property
+    def size(self) -> int:
+        return sum(s for batch in self.batches.values() for _, s in batch)
+
+
+def split_name(name: str) -> Tuple[str, str]:
+    """Return the stem of *name* and the kind of file it is.
+
+    The kind is the first extension, lower-cased: ``x.raf.xmp`` is a
+    ``raf`` file of stem ``x``.
+    """
+    stem, _, rest = name.partition(".")
+    return stem, rest.split(".", 1)[0].lower()
+
+
+def base_stem(stem: str) -> str:
+    """Return the stem of the original a developed copy was made from."""
+    match = DEVELOPED_RE.match(stem)
+    return match.group(1) if match else stem
+
+
+class _Listing:
+    """One directory's files, by stem and by original stem."""
+
+    def __init__(self, directory: Path):
+        self.by_stem: Dict[str, List[os.DirEntry]] = {}
+        self.by_base: Dict[str, List[str]] = {}
+        with pic_trace.span("scan", path=str(directory)):
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                entries = []
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file(
+                follow_symlinks=False
+            ):
+                continue
+            stem, _ = split_name(entry.name)
+            if stem not in self.by_stem:
+                self.by_stem[stem] = []
+                self.by_base.setdefault(base_stem(stem), []).append(stem)
+            self.by_stem[stem].append(entry)
+
+
+def plan(
+    delete_raw: Iterable[str],
+    delete: Iterable[str],
+    keep: Iterable[str] = (),
+) -> Plan:
+    """Decide which files to remove for the given decision lists.
+
+    *keep* names the images that stay (everything else in the
+    selection); their files, and the RAW they were developed from
+    unless they are themselves in *delete_raw*, are protected.
+    """
+    delete_raw, delete, keep = list(delete_raw), list(delete), list(keep)
+    listings: Dict[Path, _Listing] = {}
+
+    def listing(directory):
+        if directory not in listings:
+            listings[directory] = _Listing(directory)
+        return listings[directory]
+
+    keep_stems = set()
+    keep_raw = set()
+    raw_doomed = set(delete_raw)
+    for image in keep:
+        path = Path(image)
+        stem, _ = split_name(path.name)
+        keep_stems.add((path.parent, stem))
+        if image not in raw_doomed:
+            keep_raw.add((path.parent, base_stem(stem)))
+
+    result = Plan()
+    chosen: Dict[Path, Dict[str, os.DirEntry]] = {}
+    kept = set()
+    requests = [(image, True) for image in delete]
+    requests += [(image, False) for image in delete_raw]
+    for image, everything in requests:
+        path = Path(image)
+        directory = path.parent
+        found = listing(directory)
+        stem, _ = split_name(path.name)
+        base = base_stem(stem)
+        if everything:
+            stems = [stem]
+            if stem == base:
+                stems += [s for s in found.by_base.get(base, []) if s != stem]
+            candidates = [e for s in stems for e in found.by_stem.get(s, [])]
+        else:
+            candidates = [
+                e
+                for e in found.by_stem.get(base, [])
+                if split_name(e.name)[1] in RAW_KINDS
+            ]
+        if not candidates:
+            result.missing.append(image)
+            continue
+        for entry in candidates:
+            entry_stem, kind = split_name(entry.name)
+            if kind in RAW_KINDS:
+                protected = (directory, entry_stem) in keep_raw
+            else:
+                protected = (directory, entry_stem) in keep_stems
+            if protected:
+                kept.add(directory / entry.name)
+            else:
+                chosen.setdefault(directory, {})[entry.name] = entry
+
+    for directory in sorted(chosen):
+        result.batches[directory] = [
+            (name, entry.stat(follow_symlinks=False).st_size)
+            for name, entry in sorted(chosen[directory].items())
+        ]
+    result.kept = sorted(kept)
+    return result
+
+
+def plan_selection(selection: str) -> Plan:
+    """Return the :class:`Plan` for pic_select's lists for *selection*."""
+    import pic_select
+
+    images = pic_select.ImageFiles()
+    images.read(selection)
+    doomed = set(images.to_delete_image)
+    everything = (
+        images.orig
+        + images.main
+        + images.accepted
+        + images.rejected
+        + images.to_delete_raw
+    )
+    keep = [image for image in everything if image not in doomed]
+    return plan(images.to_delete_raw, images.to_delete_image, keep)
+
+
+def _trash_dir(directory: Path, trash: str) -> Path:
+    """Return (creating it) the trash for *directory*, on its filesystem."""
+    target = directory / trash
+    target.mkdir(parents=True, exist_ok=True)
+    if os.stat(target).st_dev != os.stat(directory).st_dev:
+        raise OSError(
+            errno.EXDEV, "trash is not on the same filesystem", str(target)
+        )
+    return target
+
+
+def _free_name(name: str, dir_fd: int) -> str:
+    """Return *name*, suffixed if need be, so as not to clobber a file."""
+    candidate, n = name, 0
+    while True:
+        try:
+            os.stat(candidate, dir_fd=dir_fd, follow_symlinks=False)
+        except FileNotFoundError:
+            return candidate
+        n += 1
+        candidate = f"{name}.{n}"
+
+
+def _remove_batch(directory: Path, files, trash: str | None) -> Counter:
+    counts: Counter = Counter()
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError as err:
+        print(f"{directory}: {err}", file=sys.stderr)
+        counts["failed"] += len(files)
+        return counts
+    trash_fd = None
+    try:
+        if trash is not None:
+            trash_fd = os.open(
+                _trash_dir(directory, trash), os.O_RDONLY | os.O_DIRECTORY
+            )
+        with pic_trace.span("remove", path=str(directory), files=len(files)):
+            for name, size in files:
+                try:
+                    if trash_fd is None:
+                        os.unlink(name, dir_fd=dir_fd)
+                    else:
+                        os.rename(
+                            name,
+                            _free_name(name, trash_fd),
+                            src_dir_fd=dir_fd,
+                            dst_dir_fd=trash_fd,
+                        )
+                except FileNotFoundError:
+                    counts["gone"] += 1
+                    continue
+                except OSError as err:
+                    print(f"{directory / name}: {err}", file=sys.stderr)
+                    counts["failed"] += 1
+                    continue
+                counts["files"] += 1
+                counts["bytes"] += size
+    except OSError as err:
+        print(f"{directory}: {err}", file=sys.stderr)
+        counts["failed"] += len(files) - counts["files"] - counts["gone"]
+    finally:
+        os.close(dir_fd)
+        if trash_fd is not None:
+            os.close(trash_fd)
+    return counts
+
+
+def execute(plan: Plan, trash: str | None = None, jobs: int = 4) -> Counter:
+    """Remove the files in *plan*.
+
+    With *trash*, files are moved to that directory (relative paths are
+    taken from each image's directory) rather than deleted.  Returns a
+    :class:`collections.Counter` of ``files`` and ``bytes`` removed,
+    ``gone`` (already absent) and ``failed`` files.
+    """
+    counts: Counter = Counter()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for result in pool.map(
+            lambda item: _remove_batch(item[0], item[1], trash),
+            plan.batches.items(),
+        ):
+            counts.update(result)
+    return counts
+
+
+def human_size(size: float) -> str:
+    for unit in ("B", "kB", "MB", "GB"):
+        if size < 1000 or unit == "GB":
+            break
+        size /= 1000
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Delete the files pic_select marked with d and D."
+    )
+    parser.add_argument(
+        "selection", help="The file of image names given to pic_select"
+    )
+    parser.add_argument(
+        "--trash",
+        metavar="DIR",
+        help="Move files to DIR (relative to each image's directory, "
+        "e.g. .pic-trash) instead of deleting them",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=4, help="Directories to work on at once"
+    )
+    parser.add_argument(
+        "--dryrun", action="store_true", help="Just print the plan"
+    )
+    pic_trace.add_argument(parser)
+    args = parser.parse_args()
+    pic_trace.setup(args.profile)
+
+    todo = plan_selection(args.selection)
+    verb = "delete" if args.trash is None else "trash"
+    for image in todo.missing:
+        print(f"nothing to remove for {image}")
+    if args.dryrun:
+        for path in todo.kept:
+            print(f"keep {path} (still needed)")
+        for directory, files in todo.batches.items():
+            for name, size in files:
+                print(f"{verb} {directory / name} ({human_size(size)})")
+        print(
+            f"Would {verb} {todo.files} files, {human_size(todo.size)}; "
+            f"{len(todo.kept)} shared files kept"
+        )
+        return
+
+    counts = execute(todo, args.trash, args.jobs)
+    done = "freed" if args.trash is None else "moved to trash"
+    print(
+        f"{counts['files']} files, {human_size(counts['bytes'])} {done}; "
+        f"{len(todo.kept)} shared files kept, {counts['gone']} already "
+        f"gone, {counts['failed']} failed"
+    )
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Shift the capture dates recorded inside images and XMP sidecars.
+
+``pic_mod.py --time`` renames images to correct a camera clock that was
+set wrong.  With ``--exif`` it also calls :func:`shift_files` so that
+the dates inside the files agree with their new names; otherwise
+pic_new.py and pic-essay, which read EXIF, see the wrong time again.
+
+EXIF stores DateTime, DateTimeOriginal and DateTimeDigitized as
+fixed-width ASCII (``YYYY:MM:DD HH:MM:SS``), so a shift never changes
+their length.  Each one is overwritten where it lies with ``pwrite``:
+nothing is decoded or re-encoded and the rest of the file, however
+large, is neither read nor rewritten.  JPEG, TIFF-based RAW (CR2, NEF,
+DNG, ...) and Fujifilm RAF (through its embedded JPEG) are understood.
+
+XMP sidecars are small text files; their dates (``exif:DateTimeOriginal``,
+``xmp:CreateDate`` and friends, in either EXIF or ISO 8601 form) are
+patched in their bytes and the file replaced atomically, as
+:mod:`pic_rate` does for ratings.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import re
+import struct
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, List, Tuple
+
+import pic_files
+import pic_trace
+
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+TAG_EXIF_IFD = 0x8769
+DATE_TAGS = (TAG_DATETIME, TAG_DATETIME_ORIGINAL, TAG_DATETIME_DIGITIZED)
+
+TYPE_ASCII = 2
+EXIF_FORMAT = "%Y:%m:%d %H:%M:%S"
+EXIF_LENGTH = 19
+
+RAF_MAGIC = b"FUJIFILMCCD-RAW "
+RAF_JPEG_OFFSET = 84
+MAX_IFDS = 16
+
+XMP_DATE_RE = re.compile(
+    rb"((?:exif:DateTimeOriginal|exif:DateTimeDigitized|xmp:CreateDate"
+    rb"|xmp:ModifyDate|photoshop:DateCreated)(?:\s*=\s*[\"']|>)\s*)"
+    rb"(\d{4}([:-])\d\d\3\d\d([ T])\d\d:\d\d(?::\d\d)?)"
+)
+
+
+def shift_stamp(value: bytes, delta: datetime.timedelta) -> bytes | None:
+    """Return EXIF date *value* moved by *delta*, or ``None``.
+
+    ``None`` means *value* is not a date (cameras write blanks or zeros
+    when the clock was never set) and should be left alone.
+    """
+    try:
+        when = datetime.datetime.strptime(value.decode("ascii"), EXIF_FORMAT)
+        shifted = (when + delta).strftime(EXIF_FORMAT).encode("ascii")
+    except (UnicodeDecodeError, ValueError, OverflowError):
+        return None
+    return shifted if len(shifted) == len(value) else None
+
+
+def _tiff_dates(get: Callable[[int, int], bytes]) -> List[Tuple[int, int]]:
+    """Return ``(offset, tag)`` of the date values in a TIFF structure.
+
+    *get(offset, length)* reads from the TIFF header onwards; offsets
+    returned are relative to it too.  Walks the main IFD chain and the
+    Exif IFD.
+    """
+    order = get(0, 2)
+    if order == b"II":
+        endian = "<"
+    elif order == b"MM":
+        endian = ">"
+    else:
+        return []
+    header = get(2, 6)
+    if len(header) < 6:
+        return []
+    magic, first = struct.unpack(endian + "HI", header)
+    if magic != 42:
+        return []
+    found = []
+    seen = set()
+    queue = [(first, True)]
+    while queue and len(seen) < MAX_IFDS:
+        ifd, chained = queue.pop(0)
+        if ifd == 0 or ifd in seen:
+            continue
+        seen.add(ifd)
+        raw = get(ifd, 2)
+        if len(raw) < 2:
+            continue
+        (count,) = struct.unpack(endian + "H", raw)
+        table = get(ifd + 2, 12 * count + 4)
+        if len(table) < 12 * count:
+            continue
+        for i in range(count):
+            tag, kind, length, value = struct.unpack_from(
+                endian + "HHII", table, 12 * i
+            )
+            if (
+                tag in DATE_TAGS
+                and kind == TYPE_ASCII
+                and length >= EXIF_LENGTH
+            ):
+                found.append((value, tag))
+            elif tag == TAG_EXIF_IFD:
+                queue.append((value, False))
+        if chained and len(table) == 12 * count + 4:
+            (following,) = struct.unpack_from(endian + "I", table, 12 * count)
+            queue.append((following, True))
+    return found
+
+
+def _jpeg_dates(fd: int, start: int) -> List[Tuple[int, int]]:
+    """Return ``(file offset, tag)`` for the JPEG starting at *start*."""
+    pos = start + 2
+    while True:
+        marker = os.pread(fd, 4, pos)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return []
+        if marker[1] == 0xFF:
+            pos += 1
+            continue
+        if marker[1] in (0xD9, 0xDA):
+            return []
+        (length,) = struct.unpack(">H", marker[2:])
+        if marker[1] == 0xE1:
+            segment = os.pread(fd, length - 2, pos + 4)
+            if segment.startswith(b"Exif\0\0"):
+                tiff = segment[6:]
+                base = pos + 4 + 6
+                return [
+                    (base + offset, tag)
+                    for offset, tag in _tiff_dates(
+                        lambda o, n: tiff[o : o + n]
+                    )
+                ]
+        pos += 2 + length
+
+
+def date_fields(fd: int) -> List[Tuple[int, int]]:
+    """Return ``(file offset, tag)`` of each EXIF date in open file *fd*."""
+    head = os.pread(fd, len(RAF_MAGIC), 0)
+    if head[:2] == b"\xff\xd8":
+        return _jpeg_dates(fd, 0)
+    if head[:4] in (b"II*\0", b"MM\0*"):
+        return _tiff_dates(lambda o, n: os.pread(fd, n, o))
+    if head == RAF_MAGIC:
+        raw = os.pread(fd, 4, RAF_JPEG_OFFSET)
+        if len(raw) == 4:
+            return _jpeg_dates(fd, struct.unpack(">I", raw)[0])
+    return []
+
+
+def shift_image(
+    path: str | Path, delta: datetime.timedelta, dryrun: bool = False
+) -> int:
+    """Move the EXIF dates in *path* by *delta*, in place.
+
+    Returns the number of dates changed (or, with *dryrun*, that would
+    be).
+    """
+    with open(path, "rb" if dryrun else "r+b") as f_io:
+        fd = f_io.fileno()
+        with pic_trace.span("exif-read", path=str(path)):
+            fields = date_fields(fd)
+        changed = 0
+        for offset, _ in fields:
+            shifted = shift_stamp(os.pread(fd, EXIF_LENGTH, offset), delta)
+            if shifted is None:
+                continue
+            if not dryrun:
+                os.pwrite(fd, shifted, offset)
+            changed += 1
+        if changed and not dryrun:
+            with pic_trace.span("fsync", path=str(path)):
+                os.fsync(fd)
+    return changed
+
+
+def shift_xmp(data: bytes, delta: datetime.timedelta) -> Tuple[bytes, int]:
+    """Return *data* with its capture dates moved by *delta*.
+
+    Separators, fractional seconds and time zones are kept as found.
+    Also returns the number of dates changed.
+    """
+    changed = 0
+
+    def one(match):
+        nonlocal changed
+        stamp = match.group(2).decode("ascii")
+        fmt = "%Y{d}%m{d}%d{t}%H:%M".format(
+            d=match.group(3).decode(), t=match.group(4).decode()
+        )
+        if len(stamp) == EXIF_LENGTH:
+            fmt += ":%S"
+        try:
+            when = datetime.datetime.strptime(stamp, fmt) + delta
+        except (ValueError, OverflowError):
+            return match.group(0)
+        changed += 1
+        return match.group(1) + when.strftime(fmt).encode("ascii")
+
+    return XMP_DATE_RE.sub(one, data), changed
+
+
+def shift_sidecar(
+    path: str | Path, delta: datetime.timedelta, dryrun: bool = False
+) -> int:
+    """Move the dates in XMP sidecar *path*; return how many changed."""
+    with pic_trace.span("xmp-read", path=str(path)):
+        data = Path(path).read_bytes()
+    patched, changed = shift_xmp(data, delta)
+    if changed and not dryrun:
+        with pic_trace.span("xmp-write", path=str(path)):
+            pic_files.atomic_write(path, patched)
+    return changed
+
+
+def shift_files(
+    paths: Iterable[str | Path],
+    delta: datetime.timedelta,
+    jobs: int = 8,
+    dryrun: bool = False,
+) -> Counter:
+    """Move the dates inside each of *paths* by *delta*.
+
+    Files ending in ``.xmp`` are treated as sidecars, anything else as
+    an image.  Returns a :class:`collections.Counter` of ``shifted``,
+    ``no-dates`` and ``failed`` files, and of ``dates`` changed.
+    """
+
+    def one(path):
+        shift = shift_sidecar if str(path).endswith(".xmp") else shift_image
+        try:
+            changed = shift(path, delta, dryrun)
+        except (OSError, ValueError, struct.error) as err:
+            print(f"{path}: {err}", file=sys.stderr)
+            return "failed", 0
+        if changed and dryrun:
+            print(f"{path}: would shift {changed} dates")
+        return ("shifted" if changed else "no-dates"), changed
+
+    counts: Counter = Counter()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for outcome, changed in pool.map(one, paths):
+            counts[outcome] += 1
+            counts["dates"] += changed
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Shift the EXIF and XMP dates inside images in place."
+    )
+    parser.add_argument("files", nargs="+", help="Images and XMP sidecars")
+    parser.add_argument(
+        "--hours", type=float, required=True, help="Offset to apply, in hours"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=8, help="Files to patch in parallel"
+    )
+    parser.add_argument(
+        "--dryrun", action="store_true", help="Just print what would be done"
+    )
+    pic_trace.add_argument(parser)
+    args = parser.parse_args()
+    pic_trace.setup(args.profile)
+
+    delta = datetime.timedelta(hours=args.hours)
+    counts = shift_files(args.files, delta, args.jobs, args.dryrun)
+    print(
+        f"{counts['dates']} dates shifted in {counts['shifted']} files, "
+        f"{counts['no-dates']} without dates, {counts['failed']} failed"
+    )
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
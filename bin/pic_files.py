@@ -0,0 +1,45 @@
+"""File helpers shared by the pic tools.
+
+Kept apart from the command-line modules so that a tool needing one of
+these does not import another tool to get it.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+# RAW files that sit next to a JPEG of the same stem.
+RAW_EXTENSIONS = (".raf", ".cr2", ".RAF", ".CR2")
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """Replace *path* with *data* so readers see the old or new file.
+
+    The data is written and synced to a temporary file in the same
+    directory, given *path*'s permissions (``0644`` for a new file) and
+    renamed over it.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(
+        prefix="." + path.name + ".", suffix=".tmp", dir=path.parent
+    )
+    try:
+        with os.fdopen(fd, "wb") as f_out:
+            f_out.write(data)
+            f_out.flush()
+            os.fsync(f_out.fileno())
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""Record and verify checksums of the image library.
+
+A fixity manifest lists, for each file, its BLAKE2b hash together with
+the size and modification time it had when hashed and when it was last
+verified.  ``add`` hashes files into the manifest; ``pic_new.py
+--fixity MANIFEST`` does the same for every file it creates.
+
+``verify`` is incremental.  A file whose size or mtime has changed was
+modified on purpose, so it is simply re-hashed and its entry updated.
+Files that look untouched are trusted, except for a rotating sample
+(the ``--sample`` fraction that was verified longest ago), which is
+re-hashed to catch bit rot; over ``1 / sample`` runs every file gets
+checked.  A sampled file whose hash no longer matches is reported as
+corrupt and keeps its recorded hash, so it is reported again each time
+the rotation comes back to it until it is restored from a good copy.
+
+Hashing runs in a pool of processes and can be held to a total read
+bandwidth with ``--bwlimit`` so that a verify run does not starve the
+file server.
+
+Manifest lines are tab-separated: hash, size, mtime (ns), last verified
+(seconds since the epoch) and the path relative to the manifest.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import pic_files
+import pic_trace
+
+HEADER = "# pic-fixity 1"
+DEFAULT_MANIFEST = ".pic-fixity"
+ENV_VAR = "PIC_FIXITY"
+
+CHUNK = 8 * 1024 * 1024
+MMAP_THRESHOLD = 1024 * 1024
+
+# Bytes per second each worker process may read; set by _init_worker.
+_worker_bwlimit: float | None = None
+
+
+@dataclass
+class Entry:
+    digest: str
+    size: int
+    mtime_ns: int
+    verified: float
+
+
+@dataclass
+class Report:
+    """What :func:`verify` found, as lists of manifest-relative paths."""
+
+    ok: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    corrupt: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    skipped: int = 0
+
+
+class Throttle:
+    """Sleep as needed to keep reads under *rate* bytes per second."""
+
+    def __init__(self, rate: float | None):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.done = 0
+
+    def __call__(self, nbytes: int) -> None:
+        if not self.rate:
+            return
+        self.done += nbytes
+        ahead = self.done / self.rate - (time.monotonic() - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def hash_file(path: str, bwlimit: float | None = None) -> str:
+    """Return the hex BLAKE2b digest of *path*.
+
+    Large files are mapped and hashed in place; small ones are read in
+    one go.  *bwlimit* caps the read rate in bytes per second.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    throttle = Throttle(bwlimit)
+    with open(path, "rb") as f_in:
+        size = os.fstat(f_in.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, size, CHUNK):
+                        digest.update(view[offset : offset + CHUNK])
+                        throttle(min(CHUNK, size - offset))
+                finally:
+                    view.release()
+        else:
+            while True:
+                chunk = f_in.read(CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                throttle(len(chunk))
+    return digest.hexdigest()
+
+
+def _init_worker(bwlimit: float | None) -> None:
+    global _worker_bwlimit
+    _worker_bwlimit = bwlimit
+
+
+def _hash_one(path: str) -> Tuple[str, str | None, int, int]:
+    """Return ``(path, digest, size, mtime_ns)``; digest None if gone."""
+    try:
+        before = os.stat(path)
+        digest = hash_file(path, _worker_bwlimit)
+    except FileNotFoundError:
+        return path, None, 0, 0
+    return path, digest, before.st_size, before.st_mtime_ns
+
+
+def hash_files(
+    paths: List[str], jobs: int = 4, bwlimit: float | None = None
+) -> List[Tuple[str, str | None, int, int]]:
+    """Hash *paths* across *jobs* processes sharing *bwlimit* bytes/s."""
+    if not paths:
+        return []
+    jobs = max(1, min(jobs, len(paths)))
+    per_worker = bwlimit / jobs if bwlimit else None
+    with pic_trace.span("hash", files=len(paths), jobs=jobs):
+        if jobs == 1:
+            _init_worker(per_worker)
+            return [_hash_one(p) for p in paths]
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(per_worker,),
+        ) as pool:
+            return list(pool.map(_hash_one, paths, chunksize=4))
+
+
+def load(manifest: Path) -> Dict[str, Entry]:
+    """Return the entries of *manifest*, keyed by relative path."""
+    entries: Dict[str, Entry] = {}
+    try:
+        with open(manifest) as f_in:
+            for line in f_in:
+                if line.startswith("#") or not line.strip():
+                    continue
+                digest, size, mtime_ns, verified, rel = line.rstrip(
+                    "\n"
+                ).split("\t", 4)
+                entries[rel] = Entry(
+                    digest, int(size), int(mtime_ns), float(verified)
+                )
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def save(manifest: Path, entries: Dict[str, Entry]) -> None:
+    """Atomically write *entries* to *manifest*."""
+    lines = [HEADER]
+    for rel in sorted(entries):
+        e = entries[rel]
+        lines.append(
+            f"{e.digest}\t{e.size}\t{e.mtime_ns}\t{e.verified:.0f}\t{rel}"
+        )
+    pic_files.atomic_write(manifest, ("\n".join(lines) + "\n").encode())
+
+
+def _walk(paths: Iterable[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [os.path.join(root, n) for n in sorted(names)]
+        else:
+            files.append(path)
+    return files
+
+
+def add(
+    manifest: str | Path,
+    paths: Iterable[str],
+    jobs: int = 4,
+    bwlimit: float | None = None,
+) -> int:
+    """Hash *paths* (files or directories) into *manifest*.
+
+    Returns the number of entries written.
+    """
+    manifest = Path(manifest)
+    base = manifest.resolve().parent
+    entries = load(manifest)
+    files = [
+        f for f in _walk(paths) if Path(f).resolve() != manifest.resolve()
+    ]
+    now = time.time()
+    count = 0
+    for path, digest, size, mtime_ns in hash_files(files, jobs, bwlimit):
+        if digest is None:
+            continue
+        rel = os.path.relpath(Path(path).resolve(), base)
+        entries[rel] = Entry(digest, size, mtime_ns, now)
+        count += 1
+    save(manifest, entries)
+    return count
+
+
+def verify(
+    manifest: str | Path,
+    sample: float = 0.05,
+    jobs: int = 4,
+    bwlimit: float | None = None,
+) -> Report:
+    """Check the files in *manifest*; see the module docstring."""
+    manifest = Path(manifest)
+    base = manifest.resolve().parent
+    entries = load(manifest)
+    report = Report()
+    changed, untouched = [], []
+    for rel, entry in entries.items():
+        try:
+            st = os.stat(base / rel)
+        except FileNotFoundError:
+            report.missing.append(rel)
+            continue
+        if st.st_size != entry.size or st.st_mtime_ns != entry.mtime_ns:
+            changed.append(rel)
+        else:
+            untouched.append(rel)
+
+    untouched.sort(key=lambda rel: (entries[rel].verified, rel))
+    sampled = untouched[: math.ceil(sample * len(untouched))]
+    report.skipped = len(untouched) - len(sampled)
+
+    todo = [str(base / rel) for rel in changed + sampled]
+    changed_set = set(changed)
+    now = time.time()
+    for path, digest, size, mtime_ns in hash_files(todo, jobs, bwlimit):
+        rel = os.path.relpath(path, base)
+        if digest is None:
+            report.missing.append(rel)
+        elif rel in changed_set:
+            entries[rel] = Entry(digest, size, mtime_ns, now)
+            report.changed.append(rel)
+        elif digest != entries[rel].digest:
+            entries[rel].verified = now
+            report.corrupt.append(rel)
+        else:
+            entries[rel].verified = now
+            report.ok.append(rel)
+    save(manifest, entries)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record and verify BLAKE2 checksums of image files."
+    )
+    parser.add_argument(
+        "--manifest",
+        default=os.environ.get(ENV_VAR, DEFAULT_MANIFEST),
+        help="Manifest file (default ${} or {})".format(
+            ENV_VAR, DEFAULT_MANIFEST
+        ),
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=4, help="Processes hashing in parallel"
+    )
+    parser.add_argument(
+        "--bwlimit",
+        type=float,
+        help="Total read bandwidth cap in MB/s (default unlimited)",
+    )
+    pic_trace.add_argument(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser(
+        "add", help="Hash files into the manifest"
+    )
+    add_parser.add_argument("paths", nargs="+", help="Files or directories")
+    verify_parser = commands.add_parser(
+        "verify", help="Re-check changed files and a rotating sample"
+    )
+    verify_parser.add_argument(
+        "--sample",
+        type=float,
+        default=0.05,
+        help="Fraction of unchanged files to re-hash (default 0.05)",
+    )
+    args = parser.parse_args()
+    pic_trace.setup(args.profile)
+    bwlimit = args.bwlimit * 1e6 if args.bwlimit else None
+
+    if args.command == "add":
+        count = add(args.manifest, args.paths, args.jobs, bwlimit)
+        print(f"{count} files recorded in {args.manifest}")
+        return
+
+    report = verify(args.manifest, args.sample, args.jobs, bwlimit)
+    for rel in report.corrupt:
+        print(f"CORRUPT {rel}")
+    for rel in report.missing:
+        print(f"MISSING {rel}")
+    for rel in report.changed:
+        print(f"changed {rel}")
+    print(
+        f"{len(report.ok)} verified, {len(report.changed)} changed, "
+        f"{len(report.corrupt)} corrupt, {len(report.missing)} missing, "
+        f"{report.skipped} trusted"
+    )
+    if report.corrupt:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
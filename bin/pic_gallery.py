@@ -0,0 +1,784 @@
+#!/usr/bin/env python3
+"""Serve a photo essay on demand, or freeze it to a static site.
+
+pic-essay writes everything up front: a thumbnail and a link-size copy
+of each photo and five slide pages per photo (one per slideshow delay),
+most of which nobody ever looks at.  ``pic_gallery.py serve`` instead
+runs a small local HTTP server over the same images:
+
+* the index and slide pages are rendered from the templates below when
+  they are requested;
+* the thumbnail and link-size images are made with ``convert`` the
+  first time they are requested and kept in ``OUTPUT/s``, exactly where
+  pic-essay would have put them, and remade only when the original is
+  newer;
+* every response carries an ``ETag`` (and, for images,
+  ``Last-Modified``), so a browser revalidating a page or image it has
+  already seen gets an empty ``304 Not Modified``.
+
+``pic_gallery.py freeze`` writes the whole site to ``OUTPUT``, page for
+page and byte for byte what pic-essay produces for the same options
+(reusing any images the server already made).  Both take pic-essay's
+options and, like it, default to the ``*jpg`` files of ``--input``.
+
+With ``--sprites`` the index page shows its thumbnails from a single
+sprite sheet instead of one file per photo: each photo is decoded at a
+reduced scale, the thumbnails are tiled into one image with NumPy and
+the page places each one with CSS offsets.  The sheet is rebuilt only
+when the list of photos on the page changes or one of them is newer
+than the sheet.  This needs NumPy and Pillow.
+"""
+
+from __future__ import annotations
+
+import argparse
+import email.utils
+import glob
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from typing import Dict, List, Tuple
+from urllib.parse import unquote, urlsplit
+
+import pic_files
+import pic_trace
+
+# Slideshow delays in seconds; None is the page without a slideshow.
+DELAYS = (None, 2, 3, 5, 10)
+# pic-essay picks its default delay by index after prepending None.
+DEFAULT_DELAY = DELAYS[2]
+DEFAULT_OWNER = "Jeff Abrahamson"
+GENERATED = "<!-- This file generated by pic-essay. -->\n"
+GEOMETRY_RE = re.compile(r"^(\d+)x(\d+)$")
+
+INDEX_TEMPLATE = Template(
+    "<html><title>Title</title>\n${head}<body>\n<h1>Photos</h1>\n"
+    + GENERATED
+    + '<p><a href="${reverse}">back</a><p>\n'
+    "${intro}"
+    "<p>Click images to enlarge.\n<p>\n"
+    "${rows}"
+    '<p><a href="${reverse}">back</a><p>\n'
+    "${copyright}"
+    "</body></html>\n"
+)
+ROW_TEMPLATE = Template(
+    '<table border="0" cellpadding="10">\n'
+    "<tr>${images}</tr><tr>${captions}</tr>\n"
+    "</table><hr>\n"
+)
+THUMBNAIL_TEMPLATE = Template(
+    '<td>${a_start}<img src="s/${sha}.jpg" alt="${alt}">${a_end}</td>\n'
+)
+CAPTION_TEMPLATE = Template("<td>\n${caption}\n</td>")
+SPRITE_STYLE_TEMPLATE = Template(
+    "<style>.pic-sprite{display:inline-block;"
+    "background-image:url(s/${sprite}.jpg?${version})}</style>\n"
+)
+SPRITE_CELL_TEMPLATE = Template(
+    '<td>${a_start}<span class="pic-sprite" role="img" title="${alt}" '
+    'style="width:${w}px;height:${h}px;background-position:${x}px ${y}px">'
+    "</span>${a_end}</td>\n"
+)
+SLIDE_TEMPLATE = Template(
+    "<html><head>${refresh}"
+    '<meta http-equiv="Content-type" content="text/html;charset=UTF-8">'
+    "<title>${title}</title></head>\n<body>\n\n"
+    + GENERATED
+    + "${controls}"
+    '<p><img src="${image}.jpg" alt="${alt}">\n'
+    "<p>${caption}<p>\n"
+    "${controls}"
+    "\n<!-- ORIG_FILENAME: ${original} : -->\n"
+    "${copyright}"
+    "</body></html>\n"
+)
+REFRESH_TEMPLATE = Template(
+    '<META HTTP-EQUIV="Refresh" CONTENT="${delay}; URL=${next}">'
+)
+COPYRIGHT_TEMPLATE = Template(
+    "\n<hr><p>Copyright ${year}, ${owner}.\n"
+    "<p> ${license} \n"
+    "<p><em>This file generated by pic-essay.</em>\n"
+)
+CC_LICENSE = """
+<!-- Creative Commons License -->
+<a rel="license" href="http://creativecommons.org/licenses/by-sa/2.5/"><img alt="Creative Commons License" border="0" src="http://creativecommons.org/images/public/somerights20.gif" /></a><br />
+This work is licensed under a <a rel="license" href="http://creativecommons.org/licenses/by-sa/2.5/">Creative Commons License</a>.
+<!-- /Creative Commons License -->
+
+
+<!--
+
+<rdf:RDF xmlns="http://web.resource.org/cc/"
+    xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+<Work rdf:about="">
+   <dc:type rdf:resource="http://purl.org/dc/dcmitype/StillImage" />
+   <license rdf:resource="http://creativecommons.org/licenses/by-sa/2.5/" />
+</Work>
+
+<License rdf:about="http://creativecommons.org/licenses/by-sa/2.5/">
+   <permits rdf:resource="http://web.resource.org/cc/Reproduction" />
+   <permits rdf:resource="http://web.resource.org/cc/Distribution" />
+   <requires rdf:resource="http://web.resource.org/cc/Notice" />
+   <requires rdf:resource="http://web.resource.org/cc/Attribution" />
+   <permits rdf:resource="http://web.resource.org/cc/DerivativeWorks" />
+   <requires rdf:resource="http://web.resource.org/cc/ShareAlike" />
+</License>
+
+</rdf:RDF>
+
+-->
+"""
+
+
+def sha1_hex(text: str) -> str:
+    return hashlib.sha1(os.fsencode(text)).hexdigest()
+
+
+def file_text(path: str) -> str:
+    """Return the contents of *path*, or ``""`` if it cannot be read."""
+    try:
+        with open(path, encoding="utf-8", errors="surrogateescape") as f_in:
+            return f_in.read()
+    except OSError:
+        return ""
+
+
+def base_name(path: str) -> str:
+    """Return *path* without its directory or trailing ``.jpg``."""
+    name = path.rsplit("/", 1)[-1]
+    return name[: -len(".jpg")] if name.endswith(".jpg") else name
+
+
+def button(target: str, label) -> str:
+    if target:
+        target = target.replace(":", "%3A")
+        return f'<a href="{target}">{label}</a>\n'
+    return f"{label}\n"
+
+
+class Essay:
+    """A photo essay over *files*, laid out as pic-essay lays it out.
+
+    Pages are rendered by :meth:`index_page` and :meth:`slide_page`;
+    :meth:`image` makes (or reuses) the derived images.  :meth:`routes`
+    maps every URL of the site to the piece that produces it.
+    """
+
+    def __init__(
+        self,
+        files: List[str],
+        index_name: str = "index.html",
+        input_dir: str = ".",
+        output_dir: str = ".",
+        geometry: str = "164x164",
+        link_size: str = "700x700",
+        across: int = 3,
+        reverse: str = "",
+        sprites: bool = False,
+    ):
+        self.files = list(files)
+        self.index_name = index_name
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.geometry = geometry
+        self.link_size = "" if link_size in ("", "0") else link_size
+        self.across = max(1, across)
+        self.reverse = reverse
+        self.sprites = sprites
+        self.bases = [base_name(f) for f in self.files]
+        self.shas = [sha1_hex(f) for f in self.files]
+        self._routes: Dict[str, Tuple] | None = None
+        self._lock = threading.Lock()
+        self._file_locks: Dict[str, threading.Lock] = {}
+
+    @classmethod
+    def from_options(
+        cls,
+        images: List[str],
+        input_dir: str = ".",
+        index_name: str = "",
+        **options,
+    ) -> "Essay":
+        """Pick files and index name from *images* as pic-essay does."""
+        if not images:
+            files = sorted(glob.glob(os.path.join(input_dir, "*jpg")))
+            if not index_name:
+                if input_dir == ".":
+                    directory = os.getcwd()
+                else:
+                    directory = os.path.normpath(input_dir)
+                index_name = os.path.basename(directory) + ".html"
+        else:
+            files = list(images)
+            if input_dir != ".":
+                files = [input_dir + "/" + f for f in files]
+        return cls(
+            files,
+            index_name=index_name or "index.html",
+            input_dir=input_dir,
+            **options,
+        )
+
+    # Names.
+
+    def slide_name(self, i: int, delay: int | None) -> str:
+        """Return the page name (without ``.html``) of slide *i*."""
+        if delay is None:
+            return self.shas[i]
+        return self.delay_name(self.shas[i], delay)
+
+    def delay_name(self, sha: str, delay: int) -> str:
+        return sha1_hex(f"{sha}===={delay}===={self.index_name}")
+
+    @property
+    def sprite_name(self) -> str:
+        return sha1_hex(f"sprite===={self.index_name}")
+
+    def routes(self) -> Dict[str, Tuple]:
+        """Return ``{url path: (kind, index[, delay])}`` for the site."""
+        if self._routes is None:
+            routes: Dict[str, Tuple] = {"/" + self.index_name: ("index",)}
+            if self.sprites:
+                routes[f"/s/{self.sprite_name}.jpg"] = ("sprite",)
+            for i, (base, sha) in enumerate(zip(self.bases, self.shas)):
+                if not self.sprites:
+                    routes[f"/s/{sha}.jpg"] = ("thumbnail", i)
+                if self.link_size:
+                    routes[f"/s/{base}.jpg"] = ("link", i)
+                    for delay in DELAYS:
+                        name = self.slide_name(i, delay)
+                        routes[f"/s/{name}.html"] = ("slide", i, delay)
+            self._routes = routes
+        return self._routes
+
+    # Pages.
+
+    def copyright(self, path: str) -> str:
+        year = str(time.localtime().tm_year)
+        owner = DEFAULT_OWNER
+        if path.endswith("jpg"):
+            directory = path[: path.rfind("/") + 1] or "./"
+            owner = (
+                file_text(directory + "/copyright-owner.txt")
+                or file_text(path + "owner")
+                or DEFAULT_OWNER
+            )
+            if owner.endswith("\n"):
+                owner = owner[:-1]
+            name = path.rsplit("/", 1)[-1]
+            if "-" in name:
+                name = name[: name.rfind("-")]
+            year = name[:4] or year
+        return COPYRIGHT_TEMPLATE.substitute(
+            year=year, owner=owner, license=CC_LICENSE
+        )
+
+    def _link(self, i: int) -> Tuple[str, str]:
+        if self.link_size:
+            return f'<a href="s/{self.shas[i]}.html">', "</a>"
+        return "", ""
+
+    def thumbnail_cell(self, i: int) -> str:
+        """Return the index's ``<td>`` showing photo *i*."""
+        a_start, a_end = self._link(i)
+        return THUMBNAIL_TEMPLATE.substitute(
+            a_start=a_start,
+            sha=self.shas[i],
+            alt=self.bases[i].replace(":", "%3A"),
+            a_end=a_end,
+        )
+
+    def sprite_cell(self, i: int, cell: Tuple[int, int, int, int]) -> str:
+        """Return the ``<td>`` showing photo *i* from the sprite sheet."""
+        a_start, a_end = self._link(i)
+        x, y, w, h = cell
+        return SPRITE_CELL_TEMPLATE.substitute(
+            a_start=a_start,
+            alt=self.bases[i].replace(":", "%3A"),
+            w=w,
+            h=h,
+            x=-x,
+            y=-y,
+            a_end=a_end,
+        )
+
+    def index_page(self) -> str:
+        if self.sprites:
+            cells, version = self.sprite()
+            head = SPRITE_STYLE_TEMPLATE.substitute(
+                sprite=self.sprite_name, version=version
+            )
+            images = [self.sprite_cell(i, c) for i, c in enumerate(cells)]
+        else:
+            head = ""
+            images = [self.thumbnail_cell(i) for i in range(len(self.files))]
+        intro = file_text(self.input_dir + "/index.txt")
+        if intro:
+            intro = "<p>{}<p><hr><p>".format(intro.replace("\n\n", "\n<p>\n"))
+        rows = []
+        for start in range(0, len(self.files), self.across):
+            chunk = range(start, min(start + self.across, len(self.files)))
+            rows.append(
+                ROW_TEMPLATE.substitute(
+                    images="".join(images[i] for i in chunk),
+                    captions="".join(
+                        CAPTION_TEMPLATE.substitute(caption=self.bases[i])
+                        for i in chunk
+                    ),
+                )
+            )
+        return INDEX_TEMPLATE.substitute(
+            head=head,
+            reverse=self.reverse,
+            intro=intro,
+            rows="".join(rows),
+            copyright=self.copyright(self.input_dir + "/"),
+        )
+
+    def controls(self, i: int, delay: int | None) -> str:
+        before = self.slide_name(i - 1, delay) + ".html" if i > 0 else ""
+        after = ""
+        if i + 1 < len(self.files):
+            after = self.slide_name(i + 1, delay) + ".html"
+        out = button(before, "Previous")
+        out += button("../" + self.index_name, "Index")
+        out += button(after, "Next")
+        out += "&nbsp;|&nbsp;"
+        if delay is not None:
+            out += button(self.shas[i] + ".html", "Stop Slideshow")
+        else:
+            out += button(
+                self.delay_name(self.shas[i], DEFAULT_DELAY) + ".html",
+                "Slideshow",
+            )
+        out += "&nbsp;&nbsp;(slide delay: "
+        for d in DELAYS[1:]:
+            if d == delay:
+                out += f" {d} "
+            else:
+                out += button(self.delay_name(self.shas[i], d) + ".html", d)
+        return out + ")\n"
+
+    def slide_page(self, i: int, delay: int | None) -> str:
+        base = self.bases[i]
+        escaped = base.replace(":", "%3A")
+        refresh = ""
+        if delay is not None and i + 1 < len(self.files):
+            refresh = REFRESH_TEMPLATE.substitute(
+                delay=delay, next=self.slide_name(i + 1, delay) + ".html"
+            )
+        controls = self.controls(i, delay)
+        return SLIDE_TEMPLATE.substitute(
+            refresh=refresh,
+            title=escaped,
+            controls=controls,
+            image=escaped,
+            # pic-essay escapes the name in place while looping over the
+            # delays, so only the first (no slideshow) page keeps the
+            # original in alt.
+            alt=base if delay is None else escaped,
+            caption=base,
+            original=self.files[i],
+            copyright=self.copyright(self.files[i]),
+        )
+
+    def render(self, route: Tuple) -> bytes:
+        """Return the page for a ``"index"`` or ``"slide"`` route."""
+        with pic_trace.span("render", page=route[0]):
+            if route[0] == "index":
+                page = self.index_page()
+            else:
+                page = self.slide_page(route[1], route[2])
+        return page.encode("utf-8", "surrogateescape")
+
+    # Images.
+
+    def image(self, route: Tuple) -> str:
+        """Return the path of a ``"thumbnail"`` or ``"link"`` image.
+
+        The image is made first if it is missing or older than its
+        original.  Raises :class:`FileNotFoundError` if the original is
+        gone and :class:`subprocess.CalledProcessError` if ``convert``
+        fails.
+        """
+        if route[0] == "sprite":
+            self.sprite()
+            name = self.sprite_name + ".jpg"
+            return os.path.join(self.output_dir, "s", name)
+        kind, i = route
+        if kind == "thumbnail":
+            size, name = self.geometry, self.shas[i]
+        else:
+            size, name = self.link_size, self.bases[i]
+        dest = os.path.join(self.output_dir, "s", name + ".jpg")
+        with self._file_lock(dest):
+            convert(size, self.files[i], dest)
+        if not os.path.exists(dest):
+            raise FileNotFoundError(dest)
+        return dest
+
+    def _file_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._file_locks.setdefault(path, threading.Lock())
+
+    def sprite(self) -> Tuple[List[Tuple[int, int, int, int]], str]:
+        """Return the sprite sheet's cells and a version for its URL.
+
+        Each cell is the ``(x, y, width, height)`` of a photo's
+        thumbnail in the sheet.  The sheet and a small JSON file of its
+        cells live in ``OUTPUT/s``; they are rebuilt when the photos on
+        the page change or one of them is newer than the sheet.
+        """
+        stem = os.path.join(self.output_dir, "s", self.sprite_name)
+        key = sha1_hex("\n".join([self.geometry] + self.files))
+        with self._file_lock(stem):
+            try:
+                with open(stem + ".json") as f_in:
+                    layout = json.load(f_in)
+                made = int(os.stat(stem + ".jpg").st_mtime)
+                stale = layout["key"] != key or any(
+                    _mtime(f) > made for f in self.files
+                )
+            except (OSError, ValueError, KeyError):
+                stale = True
+            if stale:
+                cells = build_sprite(
+                    self.files, sprite_box(self.geometry), stem + ".jpg"
+                )
+                layout = {"key": key, "cells": cells}
+                pic_files.atomic_write(
+                    stem + ".json", json.dumps(layout).encode()
+                )
+            version = "{:x}".format(os.stat(stem + ".jpg").st_mtime_ns)
+        return [tuple(c) for c in layout["cells"]], version
+
+    def freeze(self, jobs: int = 4, quiet: bool = False) -> None:
+        """Write the whole site to the output directory."""
+        os.makedirs(os.path.join(self.output_dir, "s"), exist_ok=True)
+        images = []
+        for path, route in self.routes().items():
+            if route[0] in ("thumbnail", "link", "sprite"):
+                images.append(route)
+                continue
+            with open(os.path.join(self.output_dir, path[1:]), "wb") as f_out:
+                f_out.write(self.render(route))
+        if not quiet:
+            for base in self.bases:
+                print(f"{base}...")
+
+        def one(route):
+            try:
+                self.image(route)
+            except FileNotFoundError:
+                pass
+            except subprocess.CalledProcessError as err:
+                print(f"{err.cmd[-2]}: convert failed", file=sys.stderr)
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            list(pool.map(one, images))
+
+
+def convert(geometry: str, src: str, dest: str) -> None:
+    """Make *dest* from *src* with ``convert`` unless it is up to date.
+
+    ``convert`` writes to a temporary file that replaces *dest* only
+    once it has succeeded, so a failed or interrupted run never leaves
+    a partial image that looks up to date.  Raises
+    :class:`subprocess.CalledProcessError` if ``convert`` fails.
+    """
+    try:
+        src_mtime = int(os.stat(src).st_mtime)
+    except FileNotFoundError:
+        print(f"Can't find source image '{src}'", file=sys.stderr)
+        return
+    try:
+        if src_mtime <= int(os.stat(dest).st_mtime):
+            return
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    partial = f"{dest}.{os.getpid()}.tmp"
+    try:
+        with pic_trace.span("convert", path=src, geometry=geometry):
+            subprocess.run(
+                ["convert", "-geometry", geometry, src, "jpg:" + partial],
+                check=True,
+            )
+        os.replace(partial, dest)
+    finally:
+        try:
+            os.unlink(partial)
+        except FileNotFoundError:
+            pass
+
+
+def _mtime(path: str) -> int:
+    try:
+        return int(os.stat(path).st_mtime)
+    except FileNotFoundError:
+        return 0
+
+
+def sprite_box(geometry: str) -> Tuple[int, int]:
+    """Return the ``(width, height)`` box of a ``WxH`` geometry."""
+    match = GEOMETRY_RE.match(geometry)
+    if match is None:
+        raise ValueError(f"sprites need a WxH geometry, not {geometry!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def decode_thumbnail(path: str, box: Tuple[int, int]):
+    """Return *path* scaled to fit *box*, as an RGB NumPy array.
+
+    ``draft`` lets libjpeg decode at 1/2, 1/4 or 1/8 scale, so a large
+    photo is never decoded at full size just to be shrunk.
+    """
+    import numpy
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.draft("RGB", box)
+        image = image.convert("RGB")
+    image.thumbnail(box)
+    return numpy.asarray(image)
+
+
+def build_sprite(
+    files: List[str], box: Tuple[int, int], dest: str, jobs: int = 4
+) -> List[Tuple[int, int, int, int]]:
+    """Tile thumbnails of *files* into the JPEG *dest*.
+
+    Every thumbnail gets a *box*-sized tile, in rows of about the square
+    root of the number of photos.  Returns each photo's ``(x, y,
+    width, height)`` in the sheet; a photo that cannot be read gets an
+    empty cell.
+    """
+    import numpy
+    from PIL import Image
+
+    width, height = box
+
+    def tile(path):
+        cell = numpy.full((height, width, 3), 255, numpy.uint8)
+        try:
+            thumb = decode_thumbnail(path, box)
+        except OSError as err:
+            print(f"Can't read source image '{path}': {err}", file=sys.stderr)
+            return cell, (0, 0)
+        cell[: thumb.shape[0], : thumb.shape[1]] = thumb
+        return cell, thumb.shape[:2]
+
+    with pic_trace.span("decode", files=len(files)):
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            tiles = list(pool.map(tile, files))
+    columns = max(1, math.ceil(math.sqrt(len(files))))
+    rows = max(1, math.ceil(len(files) / columns))
+    blank = numpy.full((height, width, 3), 255, numpy.uint8)
+    cells = [t for t, _ in tiles]
+    cells += [blank] * (rows * columns - len(cells))
+    # (rows * columns, h, w, 3) -> (rows, h, columns, w, 3) -> one sheet.
+    sheet = (
+        numpy.stack(cells)
+        .reshape(rows, columns, height, width, 3)
+        .swapaxes(1, 2)
+        .reshape(rows * height, columns * width, 3)
+    )
+    with pic_trace.span("encode-sprite", path=dest):
+        data = io.BytesIO()
+        Image.fromarray(sheet).save(data, "JPEG", quality=85)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        pic_files.atomic_write(dest, data.getvalue())
+    return [
+        ((n % columns) * width, (n // columns) * height, w, h)
+        for n, (_, (h, w)) in enumerate(tiles)
+    ]
+
+
+class GalleryHandler(BaseHTTPRequestHandler):
+    """Serve the :class:`Essay` in ``self.server.essay``."""
+
+    server_version = "pic-gallery"
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def respond(self, body: bool) -> None:
+        essay = self.server.essay
+        path = unquote(urlsplit(self.path).path)
+        if path == "/":
+            path = "/" + essay.index_name
+        route = essay.routes().get(path)
+        if route is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        mtime = None
+        if route[0] in ("index", "slide"):
+            data = essay.render(route)
+            etag = '"{}"'.format(hashlib.sha1(data).hexdigest()[:20])
+            content_type = "text/html; charset=UTF-8"
+        else:
+            try:
+                image = essay.image(route)
+                with open(image, "rb") as f_in:
+                    st = os.fstat(f_in.fileno())
+                    data = f_in.read()
+            except FileNotFoundError:
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+            except subprocess.CalledProcessError:
+                self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR)
+                return
+            mtime = st.st_mtime
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+            content_type = "image/jpeg"
+
+        status = HTTPStatus.OK
+        if self.not_modified(etag, mtime):
+            status, data = HTTPStatus.NOT_MODIFIED, b""
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        if mtime is not None:
+            self.send_header(
+                "Last-Modified", email.utils.formatdate(mtime, usegmt=True)
+            )
+        self.send_header("Cache-Control", "no-cache")
+        if status == HTTPStatus.OK:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def not_modified(self, etag: str, mtime: float | None) -> bool:
+        """Whether the client's cached copy is still good."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return etag in tags or "*" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since and mtime is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since.timestamp()
+        return False
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(
+    essay: Essay, host: str = "127.0.0.1", port: int = 8000, quiet=False
+) -> ThreadingHTTPServer:
+    """Return an HTTP server for *essay*; call ``serve_forever`` on it."""
+    server = ThreadingHTTPServer((host, port), GalleryHandler)
+    server.daemon_threads = True
+    server.essay = essay
+    server.quiet = quiet
+    return server
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("images", nargs="*", help="Images (default: *jpg)")
+    common.add_argument("--geometry", default="164x164", help="Thumbnail size")
+    common.add_argument(
+        "--link",
+        default="700x700",
+        help="Size of the images slides show, 0 for no slides",
+    )
+    common.add_argument(
+        "--across", type=int, default=3, help="Thumbnails per index row"
+    )
+    common.add_argument(
+        "--input", default=".", help="Directory of the original images"
+    )
+    common.add_argument(
+        "--output", default=".", help="Directory for the site (images in s/)"
+    )
+    common.add_argument("--index", default="", help="Name of the index page")
+    common.add_argument(
+        "--reverse", default="", help="Page the index links back to"
+    )
+    common.add_argument(
+        "--sprites",
+        action="store_true",
+        help="Show the index thumbnails from one sprite sheet per page",
+    )
+    common.add_argument("--quiet", action="store_true")
+    pic_trace.add_argument(common)
+    parser = argparse.ArgumentParser(
+        description="Serve a photo essay on demand, or freeze it like "
+        "pic-essay."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser(
+        "serve", parents=[common], help="Run a local HTTP server"
+    )
+    serve_parser.add_argument("--bind", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    freeze_parser = commands.add_parser(
+        "freeze", parents=[common], help="Write the static site"
+    )
+    freeze_parser.add_argument(
+        "--jobs", type=int, default=4, help="convert runs in parallel"
+    )
+    args = parser.parse_args()
+    pic_trace.setup(args.profile)
+    if args.sprites:
+        try:
+            import numpy  # noqa: F401
+            import PIL  # noqa: F401
+        except ImportError:
+            parser.error("--sprites needs NumPy and Pillow")
+        try:
+            sprite_box(args.geometry)
+        except ValueError as err:
+            parser.error(str(err))
+
+    essay = Essay.from_options(
+        args.images,
+        input_dir=args.input,
+        index_name=args.index,
+        output_dir=args.output,
+        geometry=args.geometry,
+        link_size=args.link,
+        across=args.across,
+        reverse=args.reverse,
+        sprites=args.sprites,
+    )
+    if args.command == "freeze":
+        essay.freeze(jobs=args.jobs, quiet=args.quiet)
+        return
+    server = make_server(essay, args.bind, args.port, args.quiet)
+    host, port = server.server_address[:2]
+    print(f"Serving http://{host}:{port}/{essay.index_name}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/env python3
 
 """
 Modify some pictures.
@@ -11,6 +11,8 @@ import glob
 import os.path
 import re
 
+import pic_trace
+
 EXTENSION_RE = re.compile(r'(^[^-]+-[^-]+-.*)\.jpg$')
 
 def rotate_images(filenames, degrees, dryrun):
@@ -28,21 +30,27 @@ def rotate_images(filenames, degrees, dryrun):
             print('{deg}: {fn}'.format(fn=filename,
                                        deg=degrees))
         else:
-            call(['/bin/mv', filename, orig_file])
-            call(['convert', '-quality', '100', '-rotate', str(degrees), orig_file, filename])
+            with pic_trace.span('mv', path=filename):
+                call(['/bin/mv', filename, orig_file])
+            with pic_trace.span('convert', path=filename):
+                call(['convert', '-quality', '100', '-rotate', str(degrees), orig_file, filename])
 
 # filename_re = re.compile('(^[^-]+)-([^-]+)-(.*)\.(jpg|cr2|raf)$')
 FILENAME_RE = re.compile(r'(^[^-]+-[^-]+)-(.*)\.(.*)$')
 DATETIME_FORMAT = '%Y%m%d-%H%M%S'
 
-def time_shift_images(filenames, hours, dryrun):
+def time_shift_images(filenames, hours, dryrun, exif=False):
     """Time shift image names by hours.
 
+    If exif is True, also shift the dates recorded inside the renamed
+    files (EXIF and XMP sidecars), see pic_exif.
+
     If dryrun is True, just print what we would have done.
     """
     num_processed = 0
     seconds = hours * 3600
     time_delta = datetime.timedelta(seconds=seconds)
+    renamed = []
     for filename in filenames:
         components = FILENAME_RE.match(filename)
         datetime_string = components.groups()[0]
@@ -50,18 +58,34 @@ def time_shift_images(filenames, hours, dryrun):
         image_datetime = datetime.datetime.strptime(datetime_string, DATETIME_FORMAT)
         image_datetime += time_delta
         new_datetime_string = datetime.datetime.strftime(image_datetime, DATETIME_FORMAT)
-        variants = glob.glob('{ds}-{ss}.*'.format(ds=datetime_string, ss=sequence_string))
+        stem = '{ds}-{ss}.'.format(ds=datetime_string, ss=sequence_string)
+        with pic_trace.span('glob', path=filename):
+            variants = glob.glob(stem + '*')
         for variant in variants:
-            extension = FILENAME_RE.match(variant).groups()[2]
+            # Keep the whole extension, so x.raf.xmp and x.jpg.xmp
+            # stay distinct.
+            extension = variant[len(stem):]
             new_filename = '{ds}-{sn}.{ext}'.format(ds=new_datetime_string,
                                                     sn=sequence_string,
                                                     ext=extension)
             num_processed += 1
             if dryrun:
                 print('{fn} -> {nfn}'.format(fn=variant, nfn=new_filename))
+                renamed.append(variant)
             else:
-                call(['/bin/mv', '-i', variant, new_filename])
+                with pic_trace.span('mv', path=variant):
+                    call(['/bin/mv', '-i', variant, new_filename])
+                # mv -i declines (EOF reads as no) when new_filename
+                # is another photo; only a file that moved was renamed.
+                if not os.path.exists(variant):
+                    renamed.append(new_filename)
     print('Processed {np} files'.format(np=num_processed))
+    if exif and renamed:
+        import pic_exif
+
+        counts = pic_exif.shift_files(renamed, time_delta, dryrun=dryrun)
+        print('Shifted {nd} dates in {nf} files ({nfail} failed)'.format(
+            nd=counts['dates'], nf=counts['shifted'], nfail=counts['failed']))
 
 def main():
     """Do what we do."""
@@ -73,6 +97,9 @@ def main():
                         help='Offset, in hours, by which to adjust time embedded in filename',
                         type=float)
     parser.set_defaults(time=0)
+    parser.add_argument('--exif',
+                        help='With --time, also shift the dates inside the images and their XMP sidecars',
+                        action='store_true')
     parser.add_argument('--rot',
                         help='Rotate images (90, 180, 270)',
                         type=int)
@@ -81,11 +108,13 @@ def main():
                         help="Don't do anything but say what we would have done",
                         dest='dryrun', action='store_true')
     parser.set_defaults(dryrun=False)
+    pic_trace.add_argument(parser)
     args = parser.parse_args()
+    pic_trace.setup(args.profile)
     if args.rot != 0:
         rotate_images(args.filename, args.rot, args.dryrun)
     if args.time != 0:
-        time_shift_images(args.filename, args.time, args.dryrun)
+        time_shift_images(args.filename, args.time, args.dryrun, args.exif)
 
 if __name__ == "__main__":
     main()
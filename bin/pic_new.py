@@ -3,12 +3,14 @@
 
 This module exposes :func:`rename_files` which accepts a list of image paths and
 returns the names of the newly created files.  When run directly it mimics the
-behaviour of the original ``pic-new`` perl script.
+behaviour of the original ``pic-new`` perl script, or with ``--watch DIR``
+renames images as they arrive in DIR (see :mod:`pic_watch`).
 """
 
 from __future__ import annotations
 
 import argparse
+import os
 import re
 import subprocess
 import time
@@ -16,16 +18,19 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Sequence
 
+import pic_trace
+
 
 def read_exif_datetime(path: Path) -> datetime | None:
     """Return the EXIF creation time of *path* if available."""
     try:
-        result = subprocess.run(
-            ["exiftags", "-i", "-s:", str(path)],
-            text=True,
-            capture_output=True,
-            check=True,
-        )
+        with pic_trace.span("exiftags", path=str(path)):
+            result = subprocess.run(
+                ["exiftags", "-i", "-s:", str(path)],
+                text=True,
+                capture_output=True,
+                check=True,
+            )
     except Exception:
         return None
     prefix = "Image Created:"
@@ -48,17 +53,28 @@ def parse_exif_time(date_str):
 def check_orientation(path: Path) -> bool:
     """Return ``True`` if ``jhead`` reports an Orientation field."""
     try:
-        result = subprocess.run(
-            ["jhead", str(path)],
-            text=True,
-            capture_output=True,
-            check=True,
-        )
+        with pic_trace.span("jhead", path=str(path)):
+            result = subprocess.run(
+                ["jhead", str(path)],
+                text=True,
+                capture_output=True,
+                check=True,
+            )
     except Exception:
         return False
     return any("Orientation" in line for line in result.stdout.splitlines())
 
 
+def _exists(path: Path) -> bool:
+    with pic_trace.span("exists", path=str(path)):
+        return path.exists()
+
+
+def _mtime(path: Path) -> datetime:
+    with pic_trace.span("stat", path=str(path)):
+        return datetime.fromtimestamp(path.stat().st_mtime)
+
+
 def do_move(
     src: Path, dest: Path, backup: Path, rotate: bool, dryrun: bool
 ) -> None:
@@ -68,7 +84,8 @@ def do_move(
         if dryrun:
             print(" ".join(cmd))
         else:
-            subprocess.run(cmd, check=True)
+            with pic_trace.span("mv", path=str(src)):
+                subprocess.run(cmd, check=True)
         return
 
     cmd_backup = ["mv", "-i", str(src), str(backup)]
@@ -80,18 +97,21 @@ def do_move(
         return
 
     print(f"{src} ==> {dest} ...")
-    if dest.exists() or backup.exists():
+    if _exists(dest) or _exists(backup):
         print("    File already exists, skipping!")
         return
-    subprocess.run(cmd_backup, check=True)
-    subprocess.run(cmd_transform, check=True)
-    backup.unlink()
+    with pic_trace.span("mv", path=str(src)):
+        subprocess.run(cmd_backup, check=True)
+    with pic_trace.span("exiftran", path=str(src)):
+        subprocess.run(cmd_transform, check=True)
+    with pic_trace.span("unlink", path=str(backup)):
+        backup.unlink()
 
 
 def rename_xmp(src: Path, dest: Path, dryrun: bool) -> List[str]:
     """Rename the sidecar XMP for *src* if present."""
     xmp_src = src.with_name(src.name + ".xmp")
-    if not xmp_src.exists():
+    if not _exists(xmp_src):
         return []
     xmp_dest = dest.with_name(dest.name + ".xmp")
     do_move(xmp_src, xmp_dest, Path("/"), rotate=False, dryrun=dryrun)
@@ -115,7 +135,7 @@ def rename_files(
         dt = read_exif_datetime(src)
         if dt is None:
             print("No EXIF creation date.")
-            dt = datetime.fromtimestamp(src.stat().st_mtime)
+            dt = _mtime(src)
 
         mtime = dt + tz_offset
         if (
@@ -126,7 +146,7 @@ def rename_files(
                     int((mtime - datetime(1970, 1, 1)).total_seconds())
                 )
             )
-            mtime = datetime.fromtimestamp(src.stat().st_mtime) + tz_offset
+            mtime = _mtime(src) + tz_offset
 
         base = f"{mtime:%Y%m%d-%H%M%S}-{seq}"
         dest = src.with_name(base).with_suffix(".jpg")
@@ -145,7 +165,7 @@ def rename_files(
 
         canon_base = src.with_suffix("")
         canon_raw = canon_base.with_suffix(".CR2")
-        if canon_raw.exists():
+        if _exists(canon_raw):
             linux_raw = dest.with_suffix(".cr2")
             do_move(
                 canon_raw, linux_raw, Path("/"), rotate=False, dryrun=dryrun
@@ -154,7 +174,7 @@ def rename_files(
             created += rename_xmp(canon_raw, linux_raw, dryrun)
 
         fuji_raw = canon_base.with_suffix(".RAF")
-        if fuji_raw.exists():
+        if _exists(fuji_raw):
             linux_raw = dest.with_suffix(".raf")
             do_move(
                 fuji_raw, linux_raw, Path("/"), rotate=False, dryrun=dryrun
@@ -181,17 +201,71 @@ def main():
     parser.add_argument(
         "--dryrun", action="store_true", help="Just print what would be done"
     )
-    parser.add_argument("images", nargs="+", help="Images to process")
+    pic_trace.add_argument(parser)
+    parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        help="Instead of renaming IMAGES, watch DIR and rename images "
+        "as they arrive (Linux only)",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        help="With --watch, seconds a file must be left closed before "
+        "it is renamed",
+    )
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=5.0,
+        help="With --watch, most seconds a ready image waits for others "
+        "to join its batch",
+    )
+    parser.add_argument(
+        "--fixity",
+        metavar="MANIFEST",
+        default=os.environ.get("PIC_FIXITY"),
+        help="Record checksums of the files created in MANIFEST (see "
+        "pic_fixity.py); default $PIC_FIXITY",
+    )
+    parser.add_argument("images", nargs="*", help="Images to process")
     args = parser.parse_args()
+    if bool(args.watch) == bool(args.images):
+        parser.error("give either images or --watch DIR")
+    pic_trace.setup(args.profile)
 
-    new_files = rename_files(
-        args.images,
-        offset_hours=args.time,
-        dryrun=args.dryrun,
-        no_rotate=args.no_rotate,
-    )
-    for name in new_files:
-        print(name)
+    def process(images: Sequence[str]) -> List[str]:
+        new_files = rename_files(
+            images,
+            offset_hours=args.time,
+            dryrun=args.dryrun,
+            no_rotate=args.no_rotate,
+        )
+        for name in new_files:
+            print(name, flush=True)
+        if args.fixity and not args.dryrun:
+            import pic_fixity
+
+            pic_fixity.add(
+                args.fixity, [f for f in new_files if os.path.exists(f)]
+            )
+        return new_files
+
+    if args.watch:
+        import pic_watch
+
+        try:
+            pic_watch.watch(
+                args.watch,
+                process,
+                settle=args.settle,
+                batch_window=args.batch_window,
+            )
+        except KeyboardInterrupt:
+            pass
+    else:
+        process(args.images)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Write pic_select decisions back into darktable XMP sidecars.
+
+pic_select records its decisions in the ``-accept``, ``-reject``,
+``-delete-raw`` and ``-delete`` files next to the selection file.  This
+module turns those decisions into ``xmp:Rating`` values (by default
+accept -> 5 stars, reject -> -1, darktable's "rejected") and writes them
+into every sidecar of each image: ``x.jpg.xmp`` as well as the
+``x.raf.xmp`` or ``x.cr2.xmp`` of its RAW.
+
+The rating is patched in place in the sidecar's bytes; the rest of the
+document, including darktable's history, is left exactly as it was.
+Sidecars that already carry the wanted rating are not rewritten, and
+the others are replaced atomically (temporary file plus rename) from a
+pool of worker threads.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import pic_files
+import pic_trace
+
+XMP_NS = b'xmlns:xmp="http://ns.adobe.com/xap/1.0/"'
+RATING_ATTR_RE = re.compile(
+    rb"""(\bxmp:Rating\s*=\s*["'])\s*(-?\d+)\s*(["'])"""
+)
+RATING_ELEM_RE = re.compile(rb"(<xmp:Rating>)\s*(-?\d+)\s*(</xmp:Rating>)")
+DESCRIPTION_RE = re.compile(rb"<rdf:Description\b")
+
+
+def patch_rating(data: bytes, rating: int) -> bytes | None:
+    """Return *data* with its rating set to *rating*.
+
+    Returns ``None`` if the sidecar already has that rating.  If it has
+    no rating at all, an ``xmp:Rating`` attribute (and, if need be, the
+    ``xmp`` namespace declaration) is added to the first
+    ``rdf:Description``.
+    """
+    match = RATING_ATTR_RE.search(data) or RATING_ELEM_RE.search(data)
+    if match:
+        if int(match.group(2)) == rating:
+            return None
+        return data[: match.start(2)] + b"%d" % rating + data[match.end(2) :]
+    match = DESCRIPTION_RE.search(data)
+    if match is None:
+        raise ValueError("no rdf:Description element")
+    insert = b' xmp:Rating="%d"' % rating
+    if b"xmlns:xmp=" not in data:
+        insert = b" " + XMP_NS + insert
+    return data[: match.end()] + insert + data[match.end() :]
+
+
+def set_rating(path: Path, rating: int, dryrun: bool = False) -> bool:
+    """Set the rating in sidecar *path*.  Return ``True`` if it changed."""
+    with pic_trace.span("xmp-read", path=str(path)):
+        data = Path(path).read_bytes()
+    patched = patch_rating(data, rating)
+    if patched is None:
+        return False
+    if dryrun:
+        print(f"{path}: rating -> {rating}")
+    else:
+        with pic_trace.span("xmp-write", path=str(path)):
+            pic_files.atomic_write(path, patched)
+    return True
+
+
+def find_sidecars(images: Iterable[str]) -> Dict[str, List[Path]]:
+    """Return ``{image: [sidecar, ...]}`` for each of *images*.
+
+    Each directory is listed once, however many images live in it, so
+    this costs one round-trip per directory rather than several stats
+    per image on a network mount.
+    """
+    listings: Dict[Path, set] = {}
+    found: Dict[str, List[Path]] = {}
+    for image in images:
+        path = Path(image)
+        directory = path.parent
+        if directory not in listings:
+            with pic_trace.span("listdir", path=str(directory)):
+                try:
+                    listings[directory] = set(os.listdir(directory))
+                except OSError:
+                    listings[directory] = set()
+        names = listings[directory]
+        candidates = [path.name + ".xmp"]
+        candidates += [
+            path.stem + ext + ".xmp" for ext in pic_files.RAW_EXTENSIONS
+        ]
+        found[image] = [directory / n for n in candidates if n in names]
+    return found
+
+
+def decisions(
+    selection: str,
+    accept: int | None = 5,
+    reject: int | None = -1,
+    delete: int | None = None,
+) -> Dict[str, int]:
+    """Return ``{image: rating}`` from pic_select's lists for *selection*.
+
+    A rating of ``None`` leaves that list alone.  Later lists win, in
+    the order accept, reject, delete-raw, delete.
+    """
+    import pic_select
+
+    images = pic_select.ImageFiles()
+    images.read(selection)
+    wanted: Dict[str, int] = {}
+    for names, rating in (
+        (images.accepted, accept),
+        (images.rejected, reject),
+        (images.to_delete_raw, delete),
+        (images.to_delete_image, delete),
+    ):
+        if rating is None:
+            continue
+        for name in names:
+            wanted[name] = rating
+    return wanted
+
+
+def apply_ratings(
+    wanted: Dict[str, int], jobs: int = 8, dryrun: bool = False
+) -> Counter:
+    """Write *wanted* ratings to every sidecar of each image.
+
+    Returns a :class:`collections.Counter` of ``changed``, ``unchanged``,
+    ``failed`` and ``no-sidecar``.
+    """
+    counts: Counter = Counter()
+    work = []
+    for image, sidecars in find_sidecars(wanted).items():
+        if not sidecars:
+            counts["no-sidecar"] += 1
+        work += [(sidecar, wanted[image]) for sidecar in sidecars]
+
+    def one(item):
+        sidecar, rating = item
+        try:
+            changed = set_rating(sidecar, rating, dryrun)
+        except (OSError, ValueError) as err:
+            print(f"{sidecar}: {err}", file=sys.stderr)
+            return "failed"
+        return "changed" if changed else "unchanged"
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        counts.update(pool.map(one, work))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write pic_select decisions into XMP sidecar ratings."
+    )
+    parser.add_argument(
+        "selection", help="The file of image names given to pic_select"
+    )
+    parser.add_argument(
+        "--accept", type=int, default=5, help="Rating for accepted images"
+    )
+    parser.add_argument(
+        "--reject", type=int, default=-1, help="Rating for rejected images"
+    )
+    parser.add_argument(
+        "--delete",
+        type=int,
+        help="Rating for images marked for deletion (default: leave alone)",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=8, help="Sidecars to write in parallel"
+    )
+    parser.add_argument(
+        "--dryrun", action="store_true", help="Just print what would be done"
+    )
+    pic_trace.add_argument(parser)
+    args = parser.parse_args()
+    pic_trace.setup(args.profile)
+
+    wanted = decisions(args.selection, args.accept, args.reject, args.delete)
+    counts = apply_ratings(wanted, jobs=args.jobs, dryrun=args.dryrun)
+    print(
+        "{changed} changed, {unchanged} already correct, {failed} failed, "
+        "{missing} images without sidecars".format(
+            changed=counts["changed"],
+            unchanged=counts["unchanged"],
+            failed=counts["failed"],
+            missing=counts["no-sidecar"],
+        )
+    )
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/env python3
 
 
 """A utility to select images.
@@ -33,9 +33,12 @@ along with pic_select.  If not, see <http://www.gnu.org/licenses/>.
 
 import curses
 import locale
+import os
 import subprocess
 import sys
 
+import pic_trace
+
 
 #### Copied, then adapted from
 #### http://code.activestate.com/recipes/134892/
@@ -69,8 +72,9 @@ def read_file(filename):
     Lines are stripped of trailing newline.
     """
     try:
-        with open(filename, 'r') as f_ptr:
-            lines = f_ptr.read().splitlines()
+        with pic_trace.span('read-list', path=filename):
+            with open(filename, 'r') as f_ptr:
+                lines = f_ptr.read().splitlines()
     except:
         #print "Failed to read " + filename + ".  Continuing as empty."
         return []
@@ -82,9 +86,10 @@ def write_file(filename, data):
     Data is an array, elements of which are written separated by
     newline characters.
     """
-    with open(filename, 'w') as f_ptr:
-        for line in data:
-            f_ptr.write(line + "\n")
+    with pic_trace.span('write-list', path=filename):
+        with open(filename, 'w') as f_ptr:
+            for line in data:
+                f_ptr.write(line + "\n")
 
 
 def screen_setup(stdscr):
@@ -181,13 +186,15 @@ class ImageFiles:
         # geeqie --remote view
         if self.main_index >= len(self.main):
             return
-        subprocess.call(['geeqie', '--remote', 'file:', \
-                             self.main[self.main_index]])
+        with pic_trace.span('geeqie', path=self.main[self.main_index]):
+            subprocess.call(['geeqie', '--remote', 'file:', \
+                                 self.main[self.main_index]])
         # Pre-cache the next image if it exists. It can take up to two
         # seconds to pull an image from my file server.
         if self.main_index + 1 < len(self.main):
-            with open(self.main[self.main_index + 1], 'r') as fp_in:
-                fp_in.read()
+            with pic_trace.span('precache', path=self.main[self.main_index + 1]):
+                with open(self.main[self.main_index + 1], 'rb') as fp_in:
+                    fp_in.read()
 
     def update_status(self, stdscr):
         """Update the status message."""
@@ -345,13 +352,22 @@ class ImageFiles:
 def usage():
     """How to invoke."""
 
-    print sys.argv[0] + " file-of-image-names"
+    print(sys.argv[0] + " file-of-image-names")
+    print("Set PIC_PROFILE=FILE to record per-stage timings.")
 
 def main():
     """Do what we do."""
     if len(sys.argv) == 1:
         usage()
         return
+    # The curses screen owns stderr, so profile to a file.
+    profile = os.environ.get(pic_trace.ENV_VAR, '')
+    if profile in ('-', '1'):
+        print('pic_select: {var} must name a file while curses has the '
+              'screen; not profiling'.format(var=pic_trace.ENV_VAR),
+              file=sys.stderr)
+        profile = ''
+    pic_trace.setup(profile)
     images = ImageFiles()
     images.read(sys.argv[1])
     curses.wrapper(images.rep_loop)
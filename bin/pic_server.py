@@ -0,0 +1,195 @@
+"""The warm server behind ``pic serve``.
+
+The server listens on a Unix ``SOCK_SEQPACKET`` socket.  Each request is
+one message of NUL-separated bytes: the number of arguments, the
+working directory, the arguments and then the environment as
+``KEY=VALUE`` (see :func:`decode_request`), carrying the client's
+stdin, stdout and stderr as ``SCM_RIGHTS`` descriptors.  The format is
+this simple so that the client needs nothing beyond ``_socket``.
+For each request the server forks; the child puts the client's
+descriptors on 0, 1 and 2, adopts its directory and environment, runs
+the command and exits.  The parent relays an interrupt from the client
+(``INT``) to the child and, when the child is done, sends its exit
+status back as ASCII digits.
+
+Requests are received and forked from the accepting thread, so no
+other thread is ever inside the interpreter's locks (such as
+``sys.stdout``'s) at the moment of the fork; only the wait for each
+child runs in its own thread.
+
+Forking keeps every request isolated (working directory, environment,
+``sys.exit``, child processes writing straight to the client's
+terminal) while still starting each command from a process that has
+already imported the tools.
+"""
+
+from __future__ import annotations
+
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import traceback
+from typing import Callable, List
+
+import pic_trace
+
+MAX_MESSAGE = 1 << 20
+# Seconds a client has to send its request after connecting.
+REQUEST_TIMEOUT = 5.0
+
+
+def decode_request(message: bytes):
+    """Return the ``(argv, cwd, env)`` of a request, as bytes."""
+    fields = message.split(b"\0")
+    argc = int(fields[0])
+    cwd, argv = fields[1], fields[2 : 2 + argc]
+    if len(argv) != argc:
+        raise ValueError("truncated request")
+    env = {}
+    for item in fields[2 + argc :]:
+        key, sep, value = item.partition(b"=")
+        if sep:
+            env[key] = value
+    return argv, cwd, env
+
+
+def _child(conn, listener, message, fds, run) -> None:
+    """Run one request in a freshly forked child; never returns."""
+    code = 1
+    try:
+        listener.close()
+        conn.close()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        argv, cwd, env = decode_request(message)
+        os.chdir(cwd)
+        os.environb.clear()
+        os.environb.update(env)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        code = run([os.fsdecode(arg) for arg in argv])
+    except SystemExit as err:
+        code = err.code if isinstance(err.code, int) else 1
+    except KeyboardInterrupt:
+        code = 128 + signal.SIGINT
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            # The server's own exit handlers must not run here; the only
+            # one a command registers is the trace summary.
+            pic_trace.finish()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code or 0)
+
+
+def _start(conn, listener, run) -> None:
+    """Receive one request on *conn* and fork a child to run it."""
+    try:
+        conn.settimeout(REQUEST_TIMEOUT)
+        message, fds, _, _ = socket.recv_fds(conn, MAX_MESSAGE, 3)
+        conn.settimeout(None)
+    except OSError:
+        conn.close()
+        return
+    if len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+        return
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        _child(conn, listener, message, fds, run)
+    for fd in fds:
+        os.close(fd)
+    threading.Thread(target=_reap, args=(conn, pid), daemon=True).start()
+
+
+def _reap(conn, pid) -> None:
+    with conn:
+        # Wake as soon as the child exits where pidfds exist; otherwise
+        # fall back to polling.
+        try:
+            pidfd = os.pidfd_open(pid)
+            watched, timeout = [conn, pidfd], None
+        except (AttributeError, OSError):
+            pidfd = None
+            watched, timeout = [conn], 0.01
+        try:
+            _wait(conn, pid, watched, timeout)
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+
+
+def _wait(conn, pid, watched, timeout) -> None:
+    """Relay interrupts to child *pid* and report its exit status."""
+    while True:
+        readable, _, _ = select.select(watched, [], [], timeout)
+        if conn in readable:
+            data = conn.recv(16)
+            # A vanished client gets a TERM, an interrupted one an INT.
+            sig = signal.SIGINT if data == b"INT" else signal.SIGTERM
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+            if not data:
+                watched = [w for w in watched if w is not conn]
+                timeout = None if watched else 0.01
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            code = os.waitstatus_to_exitcode(status)
+            if code < 0:
+                code = 128 - code
+            try:
+                conn.send(str(code).encode())
+            except OSError:
+                pass
+            return
+
+
+def serve(
+    path: str,
+    run: Callable[[List[str]], int],
+    preload: Callable[[], None] | None = None,
+) -> None:
+    """Serve ``run(argv)`` requests on the Unix socket *path*."""
+    if preload is not None:
+        preload()
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            probe.close()
+            sys.exit(f"pic serve: already running on {path}")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    old_umask = os.umask(0o077)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(old_umask)
+    listener.listen(16)
+    print(f"pic serve: listening on {path}", file=sys.stderr)
+    try:
+        while True:
+            conn, _ = listener.accept()
+            _start(conn, listener, run)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,215 @@
+"""Per-stage timing for the pic tools.
+
+The tools wrap each external program and each filesystem operation in
+:func:`span`::
+
+    with pic_trace.span("jhead", path=str(path)):
+        subprocess.run(["jhead", str(path)], ...)
+
+Tracing is off unless :func:`setup` turns it on, either from a
+``--profile`` option or from the ``PIC_PROFILE`` environment variable.
+While it is off :func:`span` returns a shared do-nothing context
+manager, so the instrumentation costs one function call per stage.
+
+When it is on, each finished span is written as one JSON line
+(``stage``, ``start``, ``duration``, ``pid`` plus whatever fields the
+caller passed) to the profile destination, and a per-stage summary
+(count, total, p50, p95, max) is printed to stderr when the program
+exits (and, for a file destination, appended to it as a final
+``{"summary": ...}`` line).  The destination ``-`` means stderr;
+anything else is a file name that is appended to, so several processes
+can share one profile.
+"""
+
+from __future__ import annotations
+
+import atexit
+import io
+import os
+import sys
+import time
+
+# Every tool imports this module, so it keeps its own imports to what
+# is already loaded at interpreter start-up or built into it (atexit);
+# json and math are imported only once tracing is enabled.
+
+ENV_VAR = "PIC_PROFILE"
+
+_sink: io.TextIOBase | None = None
+_summary_at_exit = False
+_durations: dict[str, list[float]] = {}
+
+
+class _Null:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL = _Null()
+
+
+class _Span:
+    __slots__ = ("stage", "fields", "start")
+
+    def __init__(self, stage: str, fields: dict):
+        self.stage = stage
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _durations.setdefault(self.stage, []).append(duration)
+        record = {
+            "stage": self.stage,
+            "start": time.time() - duration,
+            "duration": duration,
+            "pid": os.getpid(),
+        }
+        record.update(self.fields)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        if _sink is not None:
+            import json
+
+            _sink.write(json.dumps(record) + "\n")
+        return False
+
+
+def span(stage: str, **fields):
+    """Return a context manager that times *stage* if tracing is on."""
+    if _sink is None:
+        return _NULL
+    return _Span(stage, fields)
+
+
+def enabled() -> bool:
+    """Return ``True`` if spans are being recorded."""
+    return _sink is not None
+
+
+def enable(dest: str | io.TextIOBase = "-", summary: bool = True) -> None:
+    """Start recording spans to *dest* (``-`` for stderr).
+
+    If *summary* is true, print :func:`summary` to stderr at exit.
+    """
+    global _sink, _summary_at_exit
+    if _sink is not None:
+        return
+    if dest == "-":
+        _sink = sys.stderr
+    elif isinstance(dest, str):
+        _sink = open(dest, "a", buffering=1)
+    else:
+        _sink = dest
+    if summary:
+        _summary_at_exit = True
+        atexit.register(_print_summary)
+
+
+def disable() -> None:
+    """Stop recording spans and forget what was recorded."""
+    global _sink, _summary_at_exit
+    if _sink is not None and _sink not in (sys.stderr, sys.stdout):
+        _sink.flush()
+    _sink = None
+    _summary_at_exit = False
+    _durations.clear()
+    atexit.unregister(_print_summary)
+
+
+def finish() -> None:
+    """Print the exit summary now, if one is due.
+
+    For processes that leave with :func:`os._exit` (such as the
+    children of ``pic serve``) and so never run :mod:`atexit` handlers.
+    """
+    global _summary_at_exit
+    if _summary_at_exit:
+        _summary_at_exit = False
+        atexit.unregister(_print_summary)
+        _print_summary()
+
+
+def add_argument(parser) -> None:
+    """Add the tools' ``--profile FILE`` option to an argparse *parser*.
+
+    Pass the parsed value to :func:`setup`.
+    """
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Record per-stage timings as JSON lines to FILE ('-' for "
+        f"stderr) and print a summary at exit; see also ${ENV_VAR}",
+    )
+
+
+def setup(profile: str | None = None) -> None:
+    """Enable tracing from a ``--profile`` value or ``$PIC_PROFILE``.
+
+    ``None`` (option not given) defers to the environment; an empty
+    value or ``0`` leaves tracing off; ``1`` is a synonym for ``-``.
+    """
+    if profile is None:
+        profile = os.environ.get(ENV_VAR, "")
+    if profile in ("", "0"):
+        return
+    enable("-" if profile == "1" else profile)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Return the nearest-rank *fraction* percentile of *values*."""
+    import math
+
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summary() -> dict[str, dict[str, float]]:
+    """Return ``{stage: {count, total, p50, p95, max}}``."""
+    return {
+        stage: {
+            "count": len(values),
+            "total": sum(values),
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "max": max(values),
+        }
+        for stage, values in _durations.items()
+    }
+
+
+def format_summary(stats: dict[str, dict[str, float]]) -> str:
+    """Return *stats* as a table, slowest total first."""
+    lines = [
+        f"{'stage':<16} {'count':>7} {'total':>9} "
+        f"{'p50':>9} {'p95':>9} {'max':>9}"
+    ]
+    for stage, row in sorted(
+        stats.items(), key=lambda item: item[1]["total"], reverse=True
+    ):
+        lines.append(
+            f"{stage:<16} {row['count']:>7} {row['total']:>9.4f} "
+            f"{row['p50']:>9.4f} {row['p95']:>9.4f} {row['max']:>9.4f}"
+        )
+    return "\n".join(lines)
+
+
+def _print_summary() -> None:
+    stats = summary()
+    if stats:
+        print(format_summary(stats), file=sys.stderr)
+    if _sink is not None:
+        if _sink is not sys.stderr:
+            import json
+
+            _sink.write(json.dumps({"summary": stats}) + "\n")
+        _sink.flush()
@@ -0,0 +1,259 @@
+"""Watch a directory with inotify and hand finished images to a callback.
+
+This is the engine behind ``pic_new.py --watch DIR``: a tethered camera
+or a card reader drops files into DIR, and each image is passed to
+:func:`pic_new.rename_files` once it, and every sibling sharing its
+stem (RAW, XMP), has been closed after writing and then left alone for
+a settle delay.  A file written to and then left open without further
+writes is given up on after ``stale_after`` seconds, so it cannot hold
+back its siblings for good; directories are ignored.  Ready images
+are grouped into micro-batches: a batch goes out when it reaches
+``max_batch`` images or when its oldest image has waited
+``batch_window`` seconds, so no image waits longer than
+``settle + batch_window`` after its last write.
+
+Every name the callback reports creating goes into a processed set and
+is ignored from then on, so the renamed files appearing in the same
+directory are not picked up again; images already handled are
+remembered by name and inode, so a later file that reuses a camera's
+name (a new card, a wrapped counter) is still handled.
+
+Linux only; inotify is reached through :mod:`ctypes` so there is no
+extra dependency.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Set, Tuple
+
+import pic_trace
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg")
+
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """A minimal non-blocking inotify instance."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read(self, timeout: float) -> List[Tuple[int, str]]:
+        """Return ``[(mask, name), ...]``, waiting up to *timeout*."""
+        readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not readable:
+            return []
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(buf):
+                _, mask, _, length = _EVENT.unpack_from(buf, pos)
+                pos += _EVENT.size
+                name = buf[pos : pos + length].rstrip(b"\0")
+                pos += length
+                events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def _stem(name: str) -> str:
+    return name.split(".", 1)[0]
+
+
+class Watcher:
+    """Batch images arriving in *directory* into calls to *handler*.
+
+    *handler* receives a list of paths, in the order the images became
+    ready, and returns the paths it created (as
+    :func:`pic_new.rename_files` does).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        handler: Callable[[List[str]], Sequence[str]],
+        settle: float = 2.0,
+        batch_window: float = 5.0,
+        max_batch: int = 100,
+        stale_after: float = 60.0,
+    ):
+        self.directory = Path(directory)
+        self.handler = handler
+        self.settle = settle
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.stale_after = stale_after
+        # names the handler created; never handled
+        self.processed: Set[str] = set()
+        # (name, inode) of every image already handed to the handler
+        self.handled: Set[Tuple[str, int]] = set()
+        # name -> time of the last event seen for it
+        self.last_event: Dict[str, float] = {}
+        # names written to but not yet closed
+        self.writing: Set[str] = set()
+        # images that have settled, in arrival order, with ready time
+        self.ready: Dict[str, float] = {}
+
+    def _event(self, mask: int, name: str, now: float) -> None:
+        if name in self.processed or mask & IN_ISDIR:
+            return
+        self.last_event[name] = now
+        # Only a write says the file is open for writing: a link, or a
+        # file created and never written, gets no IN_CLOSE_WRITE.
+        if mask & IN_MODIFY:
+            self.writing.add(name)
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self.writing.discard(name)
+
+    def _promote(self, now: float) -> None:
+        """Move images whose whole stem has settled into ``ready``."""
+        busy = set()
+        for name, when in self.last_event.items():
+            if name in self.writing and now - when >= self.stale_after:
+                print(
+                    f"{name} left open for {self.stale_after:.0f}s; "
+                    "treating it as finished",
+                    file=sys.stderr,
+                )
+                self.writing.discard(name)
+            if name in self.writing or now - when < self.settle:
+                busy.add(_stem(name))
+        for name in list(self.last_event):
+            if _stem(name) in busy:
+                continue
+            del self.last_event[name]
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                self.ready.setdefault(name, now)
+
+    def _due(self, now: float) -> bool:
+        if not self.ready:
+            return False
+        if len(self.ready) >= self.max_batch:
+            return True
+        return now - next(iter(self.ready.values())) >= self.batch_window
+
+    def _next_deadline(self, now: float) -> float:
+        """Return when something may next change without a new event.
+
+        Deadlines already past are left out: a name that has settled
+        but waits on a busy sibling changes only with that sibling's
+        events, and waking for it would spin.
+        """
+        deadlines = []
+        for name, when in self.last_event.items():
+            if name in self.writing:
+                deadlines.append(when + self.stale_after)
+            else:
+                deadlines.append(when + self.settle)
+        if self.ready:
+            first = next(iter(self.ready.values()))
+            deadlines.append(first + self.batch_window)
+        return min((d for d in deadlines if d > now), default=now + 1.0)
+
+    def flush(self) -> List[str]:
+        """Hand up to ``max_batch`` ready images to the handler now."""
+        names = list(self.ready)[: self.max_batch]
+        batch = []
+        for name in names:
+            del self.ready[name]
+            try:
+                key = (name, (self.directory / name).stat().st_ino)
+            except FileNotFoundError:
+                continue
+            if key not in self.handled:
+                self.handled.add(key)
+                batch.append(str(self.directory / name))
+        if not batch:
+            return []
+        try:
+            with pic_trace.span("watch-batch", size=len(batch)):
+                created = self.handler(batch)
+        except Exception as err:
+            # One bad file must not end the watch; these images are not
+            # retried, since they are already in ``handled``.
+            print(f"Failed to handle {batch}: {err!r}", file=sys.stderr)
+            return batch
+        for path in created:
+            path = Path(path)
+            if path.parent == self.directory:
+                self.processed.add(path.name)
+        return batch
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        """Watch until *stop* is set (or forever)."""
+        inotify = Inotify()
+        try:
+            inotify.add_watch(str(self.directory), WATCH_MASK)
+            while stop is None or not stop.is_set():
+                now = time.monotonic()
+                timeout = min(self._next_deadline(now) - now, 0.5)
+                for mask, name in inotify.read(timeout):
+                    if mask & IN_Q_OVERFLOW:
+                        print(
+                            "inotify queue overflowed; some arrivals may "
+                            "have been missed",
+                            file=sys.stderr,
+                        )
+                        continue
+                    self._event(mask, name, time.monotonic())
+                now = time.monotonic()
+                self._promote(now)
+                while self._due(now):
+                    self.flush()
+                    now = time.monotonic()
+        finally:
+            inotify.close()
+
+
+def watch(
+    directory: str,
+    handler: Callable[[List[str]], Sequence[str]],
+    settle: float = 2.0,
+    batch_window: float = 5.0,
+    max_batch: int = 100,
+    stop: threading.Event | None = None,
+    stale_after: float = 60.0,
+) -> None:
+    """Run a :class:`Watcher` over *directory* until *stop* is set."""
+    Watcher(
+        directory, handler, settle, batch_window, max_batch, stale_after
+    ).run(stop)
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The tools import their shared modules (pic_trace, ...) by plain name,
+# as they do when installed side by side in ~/bin.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bin"))
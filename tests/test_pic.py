@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+
+PIC = Path(__file__).resolve().parent.parent / "bin" / "pic"
+
+
+class PicTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+        for name in (
+            "20200102-030405-0001.jpg",
+            "20200102-030406-0002.jpg",
+            "20200103-101010-0003.jpg",
+            "20200103-notes.txt",
+            ".pic-fixity",
+        ):
+            (self.tmpdir / name).touch()
+        (self.tmpdir / ".pic-trash").mkdir()
+        self.env = dict(os.environ)
+        self.env.pop("PIC_SERVER", None)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def pic(self, *args, env=None, python_args=()):
+        return subprocess.run(
+            [sys.executable, *python_args, str(PIC), *args],
+            capture_output=True,
+            text=True,
+            cwd=self.tmpdir,
+            env=env or self.env,
+        )
+
+    def test_help_imports_no_tools(self):
+        result = self.pic("--help", python_args=("-X", "importtime"))
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("select", result.stdout)
+        for module in ("pic_new", "pic_select", "pic_trace", "argparse"):
+            self.assertNotIn(f" {module}\n", result.stderr)
+
+    def test_dates_and_exit_status(self):
+        result = self.pic("dates", ".")
+        self.assertEqual(result.stdout, "20200102\n20200103\n")
+        self.assertEqual(self.pic("new").returncode, 2)
+        self.assertEqual(self.pic("no-such-command").returncode, 2)
+
+    def test_warm_server(self):
+        rundir = tempfile.TemporaryDirectory()
+        self.addCleanup(rundir.cleanup)
+        sock = Path(rundir.name) / "pic.sock"
+        server = subprocess.Popen(
+            [sys.executable, str(PIC), "serve", "--socket", str(sock)],
+            stderr=subprocess.DEVNULL,
+            env=self.env,
+        )
+        try:
+            deadline = time.monotonic() + 10
+            while not sock.exists():
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+            env = dict(self.env, PIC_SERVER=str(sock))
+            # The server runs in this test's directory, not the server's.
+            result = self.pic(
+                "dates", ".", env=env, python_args=("-X", "importtime")
+            )
+            self.assertEqual(result.stdout, "20200102\n20200103\n")
+            # The client stays thin.
+            for module in ("socket", "json"):
+                self.assertNotIn(f" {module}\n", result.stderr)
+            result = self.pic("new", env=env)
+            self.assertEqual(result.returncode, 2)
+            self.assertIn("give either images", result.stderr)
+            # The child prints the command's trace summary, though it
+            # leaves without running exit handlers.
+            result = self.pic("xmp", "5", "--profile", "-", env=env)
+            self.assertEqual(result.returncode, 0)
+            self.assertIn("stage", result.stderr)
+            self.assertIn("glob", result.stderr)
+        finally:
+            server.terminate()
+            server.wait()
+        # With the server gone the client falls back to running locally.
+        result = self.pic("dates", ".", env=env)
+        self.assertEqual(result.stdout, "20200102\n20200103\n")
+
+    def test_request_encoding(self):
+        import pic_server
+
+        message = b"\0".join(
+            [b"3", b"/t\xe9", b"xmp", b"", b"a b", b"HOME=/h", b"X=1=2"]
+        )
+        argv, cwd, env = pic_server.decode_request(message)
+        self.assertEqual(argv, [b"xmp", b"", b"a b"])
+        self.assertEqual(cwd, b"/t\xe9")
+        self.assertEqual(env, {b"HOME": b"/h", b"X": b"1=2"})
+        with self.assertRaises(ValueError):
+            pic_server.decode_request(b"3\0/\0xmp")
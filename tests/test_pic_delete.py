@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import pic_delete
+import pic_select
+
+
+class DeleteTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+        for name in (
+            "x.jpg",
+            "x.jpg.xmp",
+            "x.jpg.orig",
+            "x-2.jpg",
+            "x-2.jpg.xmp",
+            "x.raf",
+            "x.raf.xmp",
+            "x.ufraw",
+            "y.jpg",
+            "y.jpg.xmp",
+            "y.CR2",
+            "y.CR2.xmp",
+            "z.jpg",
+            "z.raf",
+            "nothing.jpg",
+        ):
+            (self.tmpdir / name).write_bytes(b"." * len(name))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def select(self, names, accepted=(), delete_raw=(), delete=()):
+        """Write pic_select's lists as if the user had pressed a, d, D."""
+        images = pic_select.ImageFiles()
+        images.main_name = str(self.tmpdir / "best.txt")
+        images.orig = [str(self.tmpdir / n) for n in names]
+        decided = set(accepted) | set(delete_raw) | set(delete)
+        images.main = [str(self.tmpdir / n) for n in names if n not in decided]
+        images.accepted = [str(self.tmpdir / n) for n in accepted]
+        images.rejected = []
+        images.to_delete_raw = [str(self.tmpdir / n) for n in delete_raw]
+        images.to_delete_image = [str(self.tmpdir / n) for n in delete]
+        images.write()
+        return images.main_name
+
+    def remaining(self):
+        return sorted(
+            p.name
+            for p in self.tmpdir.iterdir()
+            if not p.name.startswith("best.txt")
+        )
+
+    def test_siblings_from_one_scan(self):
+        selection = self.select(
+            ["x.jpg", "y.jpg", "z.jpg"], delete_raw=["y.jpg"], delete=["x.jpg"]
+        )
+        with patch.object(pic_delete.os, "scandir", wraps=os.scandir) as scandir:
+            todo = pic_delete.plan_selection(selection)
+        self.assertEqual(scandir.call_count, 1)
+        self.assertEqual(
+            [name for name, _ in todo.batches[self.tmpdir]],
+            sorted(
+                [
+                    "x-2.jpg",
+                    "x-2.jpg.xmp",
+                    "x.jpg",
+                    "x.jpg.orig",
+                    "x.jpg.xmp",
+                    "x.raf",
+                    "x.raf.xmp",
+                    "x.ufraw",
+                    "y.CR2",
+                    "y.CR2.xmp",
+                ]
+            ),
+        )
+        self.assertEqual(todo.kept, [])
+        self.assertEqual(todo.missing, [])
+
+    def test_plan_then_execute(self):
+        todo = pic_delete.plan([str(self.tmpdir / "y.jpg")], [])
+        self.assertEqual(todo.files, 2)
+        self.assertEqual(todo.size, len("y.CR2") + len("y.CR2.xmp"))
+        self.assertIn("y.CR2", self.remaining())
+        counts = pic_delete.execute(todo, jobs=2)
+        self.assertEqual(counts["files"], 2)
+        self.assertEqual(counts["bytes"], todo.size)
+        self.assertNotIn("y.CR2", self.remaining())
+        self.assertIn("y.jpg", self.remaining())
+
+    def test_shared_siblings_are_kept(self):
+        # The developed copy is in the selection too, and was accepted.
+        selection = self.select(
+            ["x.jpg", "x-2.jpg"], accepted=["x-2.jpg"], delete=["x.jpg"]
+        )
+        todo = pic_delete.plan_selection(selection)
+        counts = pic_delete.execute(todo)
+        self.assertEqual(counts["failed"], 0)
+        self.assertEqual(
+            todo.kept,
+            [
+                self.tmpdir / n
+                for n in (
+                    "x-2.jpg",
+                    "x-2.jpg.xmp",
+                    "x.raf",
+                    "x.raf.xmp",
+                    "x.ufraw",
+                )
+            ],
+        )
+        remaining = self.remaining()
+        self.assertNotIn("x.jpg", remaining)
+        self.assertNotIn("x.jpg.orig", remaining)
+        for name in ("x-2.jpg", "x.raf", "x.raf.xmp"):
+            self.assertIn(name, remaining)
+
+        # The same image in both lists is removed once.
+        todo = pic_delete.plan(
+            [str(self.tmpdir / "z.jpg")] * 2, [str(self.tmpdir / "z.jpg")]
+        )
+        self.assertEqual(todo.files, 2)
+
+    def test_missing_siblings(self):
+        todo = pic_delete.plan(
+            [str(self.tmpdir / "nothing.jpg")],
+            [str(self.tmpdir / "gone.jpg"), str(self.tmpdir / "z.jpg")],
+        )
+        self.assertEqual(
+            todo.missing,
+            [str(self.tmpdir / "gone.jpg"), str(self.tmpdir / "nothing.jpg")],
+        )
+        # Something else removes a file between planning and execution.
+        (self.tmpdir / "z.raf").unlink()
+        counts = pic_delete.execute(todo)
+        self.assertEqual(counts["files"], 1)
+        self.assertEqual(counts["gone"], 1)
+        self.assertEqual(counts["failed"], 0)
+
+    def test_trash(self):
+        (self.tmpdir / ".pic-trash").mkdir()
+        (self.tmpdir / ".pic-trash" / "z.raf").write_bytes(b"older")
+        todo = pic_delete.plan([], [str(self.tmpdir / "z.jpg")])
+        counts = pic_delete.execute(todo, trash=".pic-trash")
+        self.assertEqual(counts["files"], 2)
+        self.assertEqual(
+            sorted(os.listdir(self.tmpdir / ".pic-trash")),
+            ["z.jpg", "z.raf", "z.raf.1"],
+        )
+        self.assertEqual(
+            (self.tmpdir / ".pic-trash" / "z.raf").read_bytes(), b"older"
+        )
+        self.assertNotIn("z.jpg", self.remaining())
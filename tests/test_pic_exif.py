@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+
+import os
+import struct
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import benchmarks.synthlib as synthlib
+import pic_exif
+import pic_mod
+
+TAKEN = datetime(2020, 1, 2, 3, 4, 5)
+DATE_TAGS = (
+    synthlib.TAG_DATETIME,
+    synthlib.TAG_DATETIME_ORIGINAL,
+    synthlib.TAG_DATETIME_DIGITIZED,
+)
+
+ISO_SIDECAR = b"""<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="" xmlns:xmp="http://ns.adobe.com/xap/1.0/">
+   <xmp:CreateDate>2020-01-02T03:04:05.120+01:00</xmp:CreateDate>
+   <xmp:MetadataDate>2024-06-01T10:00</xmp:MetadataDate>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+"""
+
+
+def dates(data):
+    tags = synthlib.read_exif(data)
+    return [tags[tag] for tag in DATE_TAGS]
+
+
+def raf(jpeg):
+    """Wrap *jpeg* the way a Fujifilm RAF embeds its preview."""
+    header = bytearray(160)
+    header[:28] = pic_exif.RAF_MAGIC + b"0201FF129502"
+    struct.pack_into(">II", header, pic_exif.RAF_JPEG_OFFSET, 160, len(jpeg))
+    return bytes(header) + jpeg + os.urandom(4096)
+
+
+class ExifShiftTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_jpeg_both_byte_orders(self):
+        for byteorder in "<>":
+            path = self.tmpdir / f"{ord(byteorder)}.jpg"
+            exif = synthlib.build_exif(TAKEN, 6, byteorder)
+            before = synthlib.encode_jpeg(16, 16, exif=exif)
+            path.write_bytes(before)
+            changed = pic_exif.shift_image(path, timedelta(hours=-26))
+            self.assertEqual(changed, 3)
+            after = path.read_bytes()
+            self.assertEqual(len(after), len(before))
+            self.assertEqual(dates(after), ["2020:01:01 01:04:05"] * 3)
+            # Nothing but the 19-byte dates moved.
+            differing = [i for i in range(len(after)) if after[i] != before[i]]
+            self.assertLessEqual(len(differing), 3 * 19)
+            self.assertEqual(synthlib.read_exif(after)[0x0112], 6)
+
+    def test_tiff_and_raf_containers(self):
+        for byteorder in "<>":
+            exif = synthlib.build_exif(TAKEN, 1, byteorder)
+            tiff = self.tmpdir / f"{ord(byteorder)}.cr2"
+            tiff.write_bytes(exif[6:] + os.urandom(4096))
+            self.assertEqual(pic_exif.shift_image(tiff, timedelta(hours=1)), 3)
+            shifted = synthlib._read_tiff(tiff.read_bytes())
+            self.assertEqual(
+                shifted[synthlib.TAG_DATETIME_ORIGINAL], "2020:01:02 04:04:05"
+            )
+
+            fuji = self.tmpdir / f"{ord(byteorder)}.raf"
+            fuji.write_bytes(raf(synthlib.encode_jpeg(16, 16, exif=exif)))
+            self.assertEqual(pic_exif.shift_image(fuji, timedelta(hours=1)), 3)
+            self.assertEqual(
+                dates(fuji.read_bytes()[160:]), ["2020:01:02 04:04:05"] * 3
+            )
+
+    def test_unset_clock_and_unknown_files_are_left_alone(self):
+        self.assertIsNone(
+            pic_exif.shift_stamp(b"0000:00:00 00:00:00", timedelta(hours=1))
+        )
+        self.assertIsNone(
+            pic_exif.shift_stamp(b"    :  :     :  :  ", timedelta(hours=1))
+        )
+        other = self.tmpdir / "notes.txt"
+        other.write_bytes(b"not an image")
+        counts = pic_exif.shift_files([other], timedelta(hours=1), jobs=1)
+        self.assertEqual(counts["no-dates"], 1)
+        self.assertEqual(other.read_bytes(), b"not an image")
+
+    def test_sidecar_dates(self):
+        darktable = self.tmpdir / "x.raf.xmp"
+        darktable.write_text(synthlib.darktable_xmp("x.raf", TAKEN, 1))
+        iso = self.tmpdir / "x.jpg.xmp"
+        iso.write_bytes(ISO_SIDECAR)
+        counts = pic_exif.shift_files(
+            [darktable, iso], timedelta(hours=-4), jobs=2
+        )
+        self.assertEqual(counts["shifted"], 2)
+        self.assertIn(
+            'exif:DateTimeOriginal="2020:01:01 23:04:05.000"',
+            darktable.read_text(),
+        )
+        self.assertEqual(
+            iso.read_bytes(),
+            ISO_SIDECAR.replace(
+                b"2020-01-02T03:04:05", b"2020-01-01T23:04:05"
+            ),
+        )
+
+    def test_pic_mod_time_shift(self):
+        stem = "20200102-030405-0001"
+        exif = synthlib.build_exif(TAKEN, 1, ">")
+        (self.tmpdir / f"{stem}.jpg").write_bytes(
+            synthlib.encode_jpeg(16, 16, exif=exif)
+        )
+        (self.tmpdir / f"{stem}.raf").write_bytes(
+            raf(synthlib.encode_jpeg(16, 16, exif=exif))
+        )
+        (self.tmpdir / f"{stem}.raf.xmp").write_text(
+            synthlib.darktable_xmp(f"{stem}.raf", TAKEN, 1)
+        )
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            pic_mod.time_shift_images([f"{stem}.jpg"], 1.5, False, exif=True)
+        finally:
+            os.chdir(cwd)
+        new = "20200102-043405-0001"
+        self.assertEqual(
+            sorted(os.listdir(self.tmpdir)),
+            [f"{new}.jpg", f"{new}.raf", f"{new}.raf.xmp"],
+        )
+        self.assertEqual(
+            dates((self.tmpdir / f"{new}.jpg").read_bytes()),
+            ["2020:01:02 04:34:05"] * 3,
+        )
+        self.assertIn(
+            "2020:01:02 04:34:05.000",
+            (self.tmpdir / f"{new}.raf.xmp").read_text(),
+        )
+
+    def test_pic_mod_leaves_a_declined_rename_alone(self):
+        stem, taken = "20200102-030405-0001", "20200102-043405-0001"
+        exif = synthlib.build_exif(TAKEN, 1, ">")
+        for name in (stem, taken):
+            (self.tmpdir / f"{name}.jpg").write_bytes(
+                synthlib.encode_jpeg(16, 16, exif=exif)
+            )
+        before = (self.tmpdir / f"{taken}.jpg").read_bytes()
+
+        def call(cmd):
+            # What mv -i does when nobody answers its prompt.
+            return subprocess.call(cmd, stdin=subprocess.DEVNULL)
+
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            with patch.object(pic_mod, "call", call):
+                pic_mod.time_shift_images(
+                    [f"{stem}.jpg"], 1.5, False, exif=True
+                )
+        finally:
+            os.chdir(cwd)
+        self.assertTrue((self.tmpdir / f"{stem}.jpg").exists())
+        self.assertEqual((self.tmpdir / f"{taken}.jpg").read_bytes(), before)
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import pic_fixity
+import pic_new
+
+
+def flip_byte(path, offset):
+    """Corrupt *path* without changing its size or mtime, like bit rot."""
+    st = os.stat(path)
+    with open(path, "r+b") as f_io:
+        f_io.seek(offset)
+        byte = f_io.read(1)
+        f_io.seek(offset)
+        f_io.write(bytes([byte[0] ^ 0x01]))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+class FixityTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+        self.manifest = self.tmpdir / ".pic-fixity"
+        self.files = []
+        for i in range(4):
+            path = self.tmpdir / f"2020010{i}-000000-000{i}.jpg"
+            path.write_bytes(os.urandom(4096))
+            self.files.append(path)
+        # Big enough to go through mmap.
+        self.big = self.tmpdir / "20200105-000000-0005.raf"
+        self.big.write_bytes(os.urandom(pic_fixity.MMAP_THRESHOLD + 12345))
+        pic_fixity.add(self.manifest, [str(self.tmpdir)], jobs=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_full_verify_detects_flipped_byte(self):
+        flip_byte(self.files[2], 100)
+        flip_byte(self.big, pic_fixity.MMAP_THRESHOLD + 10)
+        report = pic_fixity.verify(self.manifest, sample=1.0, jobs=2)
+        self.assertEqual(
+            sorted(report.corrupt), sorted([self.files[2].name, self.big.name])
+        )
+        self.assertEqual(len(report.ok), 3)
+        # The recorded hash is kept, so the damage is reported again.
+        report = pic_fixity.verify(self.manifest, sample=1.0, jobs=1)
+        self.assertEqual(len(report.corrupt), 2)
+
+    def test_incremental_rehashes_only_changed_files(self):
+        self.files[0].write_bytes(b"edited on purpose")
+        flip_byte(self.files[1], 0)
+        self.files[3].unlink()
+        report = pic_fixity.verify(self.manifest, sample=0.0, jobs=1)
+        self.assertEqual(report.changed, [self.files[0].name])
+        self.assertEqual(report.missing, [self.files[3].name])
+        self.assertEqual(report.corrupt, [])
+        self.assertEqual(report.skipped, 3)
+        report = pic_fixity.verify(self.manifest, sample=0.0, jobs=1)
+        self.assertEqual(report.changed, [])
+
+    def test_rotating_sample_covers_everything(self):
+        flip_byte(self.files[3], 7)
+        seen = set()
+        for run in range(1, 6):
+            # Keep "verified" timestamps distinct between runs.
+            with patch.object(
+                pic_fixity.time, "time", return_value=time.time() + 10 * run
+            ):
+                report = pic_fixity.verify(self.manifest, sample=0.2, jobs=1)
+            self.assertEqual(len(report.ok) + len(report.corrupt), 1)
+            seen.update(report.ok + report.corrupt)
+        self.assertEqual(len(seen), 5)
+        self.assertIn(self.files[3].name, seen)
+
+    def test_bandwidth_cap(self):
+        start = time.monotonic()
+        pic_fixity.hash_file(str(self.big), bwlimit=4 * 1024 * 1024)
+        self.assertGreater(time.monotonic() - start, 0.2)
+
+    def test_pic_new_records_created_files(self):
+        src = self.tmpdir / "incoming" / "img_0001.jpg"
+        src.parent.mkdir()
+        src.write_bytes(b"fresh from the camera")
+        manifest = self.tmpdir / "incoming" / "manifest"
+        argv = ["pic_new.py", "--nr", "--fixity", str(manifest), str(src)]
+        with patch("sys.argv", argv), patch.object(
+            pic_new, "read_exif_datetime", return_value=None
+        ), patch.object(pic_new, "check_orientation", return_value=False):
+            pic_new.main()
+        entries = pic_fixity.load(manifest)
+        self.assertEqual(len(entries), 1)
+        (rel,) = entries
+        self.assertTrue(rel.endswith("-0001.jpg"))
+        flip_byte(manifest.parent / rel, 3)
+        report = pic_fixity.verify(manifest, sample=1.0, jobs=1)
+        self.assertEqual(report.corrupt, [rel])
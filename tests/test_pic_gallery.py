@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+
+import filecmp
+import http.client
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+import benchmarks.fake_tools as fake_tools
+import benchmarks.synthlib as synthlib
+import pic_gallery
+
+PIC_ESSAY = Path(__file__).resolve().parent.parent / "bin" / "pic-essay"
+
+try:
+    import numpy
+    from PIL import Image
+except ImportError:
+    numpy = None
+
+
+def have_pic_essay():
+    try:
+        return (
+            subprocess.run(
+                ["perl", "-MDigest::SHA", "-MDate::Parse", "-e", "1"],
+                capture_output=True,
+            ).returncode
+            == 0
+        )
+    except FileNotFoundError:
+        return False
+
+
+class GalleryTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+        tools = self.tmpdir / "tools"
+        fake_tools.install(tools)
+        path = os.pathsep.join([str(tools), os.environ.get("PATH", "")])
+        environ = patch.dict(os.environ, {"PATH": path})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        self.input = self.tmpdir / "in"
+        self.input.mkdir()
+        self.names = []
+        for i in range(4):
+            name = f"2020010{i + 1}-120000-000{i}.jpg"
+            exif = synthlib.build_exif(datetime(2020, 1, i + 1, 12))
+            data = synthlib.encode_jpeg(16, 16, seed=i, exif=exif)
+            (self.input / name).write_bytes(data)
+            self.names.append(name)
+        (self.input / "index.txt").write_text("A walk.\n\nIn the snow.\n")
+        self.output = self.tmpdir / "out"
+        self.essay = pic_gallery.Essay.from_options(
+            self.names,
+            input_dir=str(self.input),
+            index_name="walk.html",
+            output_dir=str(self.output),
+        )
+        self.server = pic_gallery.make_server(self.essay, port=0, quiet=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def get(self, path, **headers):
+        conn = http.client.HTTPConnection(*self.server.server_address[:2])
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            return response, response.read()
+        finally:
+            conn.close()
+
+    def cached(self):
+        try:
+            return sorted(os.listdir(self.output / "s"))
+        except FileNotFoundError:
+            return []
+
+    def test_pages_and_images_on_demand(self):
+        response, body = self.get("/")
+        self.assertEqual(response.status, 200)
+        self.assertIn(b"<p>A walk.\n<p>\nIn the snow.\n", body)
+        sha = self.essay.shas[2]
+        self.assertIn(f'<a href="s/{sha}.html">'.encode(), body)
+        self.assertEqual(self.cached(), [])
+
+        response, body = self.get(f"/s/{sha}.html")
+        self.assertEqual(response.status, 200)
+        self.assertIn(b'<img src="20200103-120000-0002.jpg"', body)
+        self.assertEqual(self.cached(), [])
+
+        response, body = self.get(f"/s/{sha}.jpg")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Type"), "image/jpeg")
+        self.assertEqual(body, (self.input / self.names[2]).read_bytes())
+        self.assertEqual(self.cached(), [f"{sha}.jpg"])
+
+        response, _ = self.get("/s/20200103-120000-0002.jpg")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(self.cached()), 2)
+
+        self.assertEqual(self.get("/s/../../etc/passwd")[0].status, 404)
+        self.assertEqual(self.get("/s/nothing.jpg")[0].status, 404)
+
+    def test_conditional_requests(self):
+        path = f"/s/{self.essay.shas[0]}.jpg"
+        response, _ = self.get(path)
+        etag = response.getheader("ETag")
+        last_modified = response.getheader("Last-Modified")
+        cached = self.output / "s" / path[3:]
+        made = cached.stat().st_mtime_ns
+
+        response, body = self.get(path, **{"If-None-Match": etag})
+        self.assertEqual((response.status, body), (304, b""))
+        response, body = self.get(path, **{"If-Modified-Since": last_modified})
+        self.assertEqual((response.status, body), (304, b""))
+        self.assertEqual(made, cached.stat().st_mtime_ns)
+
+        response, _ = self.get("/walk.html")
+        page_etag = response.getheader("ETag")
+        response, _ = self.get("/walk.html", **{"If-None-Match": page_etag})
+        self.assertEqual(response.status, 304)
+
+        # A newer original is converted again and gets a new validator.
+        later = time.time() + 100
+        os.utime(self.input / self.names[0], (later, later))
+        response, _ = self.get(path, **{"If-None-Match": etag})
+        self.assertEqual(response.status, 200)
+        self.assertNotEqual(response.getheader("ETag"), etag)
+
+    def test_failed_convert_is_not_cached(self):
+        # A convert that dies half way through its output.
+        broken = self.tmpdir / "broken"
+        broken.mkdir()
+        (broken / "convert").write_text(
+            "#!/bin/sh\nfor a; do out=$a; done\n"
+            'printf partial > "${out#jpg:}"\nexit 1\n'
+        )
+        (broken / "convert").chmod(0o755)
+        path = f"/s/{self.essay.shas[1]}.jpg"
+        broken_path = os.pathsep.join([str(broken), os.environ["PATH"]])
+        with patch.dict(os.environ, {"PATH": broken_path}):
+            response, _ = self.get(path)
+        self.assertEqual(response.status, 500)
+        self.assertEqual(self.cached(), [])
+
+        response, body = self.get(path)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, (self.input / self.names[1]).read_bytes())
+
+    def test_freeze_writes_what_was_served(self):
+        served = {}
+        for url, route in self.essay.routes().items():
+            if route[0] in ("index", "slide"):
+                served[url] = self.get(url)[1]
+        self.assertEqual(len(served), 1 + 5 * len(self.names))
+        self.essay.freeze(jobs=2, quiet=True)
+        for url, body in served.items():
+            self.assertEqual((self.output / url[1:]).read_bytes(), body)
+        self.assertEqual(len(self.cached()), 7 * len(self.names))
+
+    @skipUnless(have_pic_essay(), "pic-essay needs perl with Date::Parse")
+    def test_freeze_matches_pic_essay(self):
+        (self.input / "a:b.jpg").write_bytes(b"colons")
+        names = self.names + ["a:b.jpg"]
+        options = ["--input", "in", "--index", "walk.html", "--across", "2"]
+        (self.tmpdir / "perl").mkdir()
+        subprocess.run(
+            ["perl", str(PIC_ESSAY), "--output", "perl", *options, *names],
+            cwd=self.tmpdir,
+            check=True,
+            capture_output=True,
+        )
+        essay = pic_gallery.Essay.from_options(
+            names,
+            input_dir="in",
+            index_name="walk.html",
+            output_dir=str(self.tmpdir / "py"),
+            across=2,
+        )
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            essay.freeze(quiet=True)
+        finally:
+            os.chdir(cwd)
+        perl = self.tmpdir / "perl"
+        # pic-essay leaves its convert runs in the background.
+        deadline = time.monotonic() + 10
+        while len(os.listdir(perl / "s")) < 7 * len(names):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        time.sleep(0.2)
+        comparison = filecmp.dircmp(perl, self.tmpdir / "py")
+        self.assertEqual(comparison.left_only + comparison.right_only, [])
+        self.assertEqual(comparison.diff_files, [])
+        sub = comparison.subdirs["s"]
+        self.assertEqual(sub.left_only + sub.right_only, [])
+        _, mismatch, errors = filecmp.cmpfiles(
+            perl / "s", self.tmpdir / "py" / "s", sub.common_files, False
+        )
+        self.assertEqual(mismatch + errors, [])
+
+
+@skipUnless(numpy is not None, "sprites need NumPy and Pillow")
+class SpriteTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+        self.input = self.tmpdir / "in"
+        self.input.mkdir()
+        self.output = self.tmpdir / "out"
+        for i in range(5):
+            self.add(i)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add(self, i):
+        name = f"2020010{i + 1}-120000-000{i}.jpg"
+        data = synthlib.encode_jpeg(64, 48, seed=i)
+        (self.input / name).write_bytes(data)
+
+    def essay(self):
+        return pic_gallery.Essay.from_options(
+            [],
+            input_dir=str(self.input),
+            index_name="walk.html",
+            output_dir=str(self.output),
+            geometry="32x32",
+            link_size="0",
+            sprites=True,
+        )
+
+    def test_index_uses_one_sheet(self):
+        essay = self.essay()
+        essay.freeze(quiet=True)
+        self.assertEqual(
+            sorted(os.listdir(self.output / "s")),
+            [f"{essay.sprite_name}.jpg", f"{essay.sprite_name}.json"],
+        )
+        index = (self.output / "walk.html").read_text()
+        self.assertIn(f"background-image:url(s/{essay.sprite_name}.jpg?", index)
+        self.assertNotIn('<img src="s/', index)
+        cells, _ = essay.sprite()
+        # Five photos make a 3x2 grid of 32x32 tiles; each is 32x24.
+        self.assertEqual(
+            cells[:4],
+            [(0, 0, 32, 24), (32, 0, 32, 24), (64, 0, 32, 24), (0, 32, 32, 24)],
+        )
+        self.assertIn("background-position:-32px 0px", index)
+
+        with Image.open(self.output / "s" / f"{essay.sprite_name}.jpg") as im:
+            self.assertEqual(im.size, (96, 64))
+            sheet = numpy.asarray(im.convert("RGB"), dtype=int)
+        for i, (x, y, w, h) in enumerate(cells):
+            thumb = pic_gallery.decode_thumbnail(essay.files[i], (32, 32))
+            crop = sheet[y : y + h, x : x + w]
+            self.assertLess(numpy.abs(crop - thumb).mean(), 8)
+
+    def test_sheet_rebuilt_only_when_the_photos_change(self):
+        essay = self.essay()
+        essay.index_page()
+        sheet = self.output / "s" / f"{essay.sprite_name}.jpg"
+        made = sheet.stat().st_mtime_ns
+        decode = pic_gallery.decode_thumbnail
+        with patch.object(
+            pic_gallery, "decode_thumbnail", wraps=decode
+        ) as decoded:
+            self.essay().index_page()
+            self.assertEqual(decoded.call_count, 0)
+            self.assertEqual(sheet.stat().st_mtime_ns, made)
+
+            self.add(5)
+            page = self.essay().index_page()
+            self.assertEqual(decoded.call_count, 6)
+        self.assertEqual(page.count('class="pic-sprite"'), 6)
+        with Image.open(sheet) as im:
+            self.assertEqual(im.size, (96, 64))
@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+
+import importlib.util
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import pic_rate
+import pic_select
+
+BIN = Path(__file__).resolve().parent.parent / "bin"
+_spec = importlib.util.spec_from_file_location("pic_xmp", BIN / "pic-xmp.py")
+pic_xmp = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pic_xmp)
+
+# As written by darktable 4.x (history shortened).
+DARKTABLE_SIDECAR = """<?xml version="1.0" encoding="UTF-8"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="XMP Core 4.4.0-Exiv2">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:exif="http://ns.adobe.com/exif/1.0/"
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:xmpMM="http://ns.adobe.com/xap/1.0/mm/"
+    xmlns:darktable="http://darktable.sf.net/"
+   exif:DateTimeOriginal="2025:04:11 11:10:16.000"
+   xmp:Rating="1"
+   xmpMM:DerivedFrom="20250411-111016-3393.raf"
+   darktable:import_timestamp="63880542616000000"
+   darktable:xmp_version="5"
+   darktable:raw_params="0"
+   darktable:auto_presets_applied="1"
+   darktable:history_end="1">
+   <darktable:history>
+    <rdf:Seq>
+     <rdf:li
+      darktable:num="0"
+      darktable:operation="exposure"
+      darktable:enabled="1"
+      darktable:modversion="6"
+      darktable:params="00000000000080b90000000000004842"
+      darktable:multi_name=""
+      darktable:multi_priority="0"/>
+    </rdf:Seq>
+   </darktable:history>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+"""
+
+# Older tools write the rating as an element, not an attribute.
+ELEMENT_SIDECAR = """<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="" xmlns:xmp="http://ns.adobe.com/xap/1.0/">
+   <xmp:Rating>2</xmp:Rating>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+"""
+
+UNRATED_SIDECAR = """<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""/>
+ </rdf:RDF>
+</x:xmpmeta>
+"""
+
+
+class RatingWriteTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sidecar(self, name, text):
+        path = self.tmpdir / name
+        path.write_text(text)
+        return path
+
+    def test_round_trip_preserves_everything_else(self):
+        path = self.sidecar("a.raf.xmp", DARKTABLE_SIDECAR)
+        self.assertTrue(pic_rate.set_rating(path, -1))
+        self.assertEqual(pic_xmp.get_rating_from_xmp(path), -1)
+        self.assertEqual(
+            path.read_text(),
+            DARKTABLE_SIDECAR.replace('xmp:Rating="1"', 'xmp:Rating="-1"'),
+        )
+
+    def test_element_and_missing_ratings(self):
+        element = self.sidecar("b.jpg.xmp", ELEMENT_SIDECAR)
+        unrated = self.sidecar("c.jpg.xmp", UNRATED_SIDECAR)
+        pic_rate.set_rating(element, 4)
+        pic_rate.set_rating(unrated, 3)
+        self.assertEqual(pic_xmp.get_rating_from_xmp(element), 4)
+        self.assertEqual(pic_xmp.get_rating_from_xmp(unrated), 3)
+
+    def test_idempotent(self):
+        path = self.sidecar("a.raf.xmp", DARKTABLE_SIDECAR)
+        self.assertTrue(pic_rate.set_rating(path, 5))
+        before = os.stat(path)
+        self.assertFalse(pic_rate.set_rating(path, 5))
+        after = os.stat(path)
+        self.assertEqual(before.st_ino, after.st_ino)
+        self.assertEqual(before.st_mtime_ns, after.st_mtime_ns)
+
+    def test_apply_selection_decisions(self):
+        for stem in ("acc", "rej", "kept"):
+            self.sidecar(f"{stem}.jpg.xmp", DARKTABLE_SIDECAR)
+            self.sidecar(f"{stem}.raf.xmp", DARKTABLE_SIDECAR)
+        images = pic_select.ImageFiles()
+        images.main_name = str(self.tmpdir / "best.txt")
+        images.main = [str(self.tmpdir / "kept.jpg")]
+        images.orig = images.main
+        images.accepted = [str(self.tmpdir / "acc.jpg")]
+        images.rejected = [
+            str(self.tmpdir / "rej.jpg"),
+            str(self.tmpdir / "gone.jpg"),
+        ]
+        images.to_delete_raw = []
+        images.to_delete_image = []
+        images.write()
+
+        wanted = pic_rate.decisions(images.main_name)
+        counts = pic_rate.apply_ratings(wanted, jobs=4)
+        self.assertEqual(counts["changed"], 4)
+        self.assertEqual(counts["no-sidecar"], 1)
+        for name, rating in (
+            ("acc.jpg.xmp", 5),
+            ("acc.raf.xmp", 5),
+            ("rej.jpg.xmp", -1),
+            ("rej.raf.xmp", -1),
+            ("kept.raf.xmp", 1),
+        ):
+            self.assertEqual(
+                pic_xmp.get_rating_from_xmp(self.tmpdir / name), rating
+            )
+
+        counts = pic_rate.apply_ratings(wanted, jobs=4)
+        self.assertEqual(counts["changed"], 0)
+        self.assertEqual(counts["unchanged"], 4)
+        self.assertEqual(
+            sorted(p.name for p in self.tmpdir.iterdir() if "tmp" in p.name),
+            [],
+        )
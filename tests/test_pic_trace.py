@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+from unittest import TestCase
+from unittest.mock import patch
+
+import pic_trace
+
+
+class TraceTests(TestCase):
+    def tearDown(self):
+        pic_trace.disable()
+
+    def test_disabled_span_is_shared_noop(self):
+        self.assertFalse(pic_trace.enabled())
+        first = pic_trace.span("jhead", path="a.jpg")
+        second = pic_trace.span("mv")
+        self.assertIs(first, second)
+        with first:
+            pass
+        self.assertEqual(pic_trace.summary(), {})
+
+    def test_enabled_records_json_lines_and_summary(self):
+        sink = io.StringIO()
+        pic_trace.enable(sink, summary=False)
+        for _ in range(3):
+            with pic_trace.span("jhead", path="a.jpg"):
+                pass
+        with self.assertRaises(OSError):
+            with pic_trace.span("mv"):
+                raise OSError("boom")
+
+        records = [json.loads(line) for line in sink.getvalue().splitlines()]
+        self.assertEqual([r["stage"] for r in records], ["jhead"] * 3 + ["mv"])
+        self.assertEqual(records[0]["path"], "a.jpg")
+        self.assertEqual(records[-1]["error"], "OSError")
+        stats = pic_trace.summary()
+        self.assertEqual(stats["jhead"]["count"], 3)
+        self.assertEqual(stats["mv"]["count"], 1)
+        self.assertLessEqual(stats["jhead"]["p50"], stats["jhead"]["p95"])
+
+    def test_percentile_nearest_rank(self):
+        values = [float(v) for v in range(1, 21)]
+        self.assertEqual(pic_trace.percentile(values, 0.5), 10.0)
+        self.assertEqual(pic_trace.percentile(values, 0.95), 19.0)
+        self.assertEqual(pic_trace.percentile([3.0], 0.95), 3.0)
+
+    def test_profile_option(self):
+        import argparse
+
+        parser = argparse.ArgumentParser()
+        pic_trace.add_argument(parser)
+        self.assertIsNone(parser.parse_args([]).profile)
+        self.assertEqual(parser.parse_args(["--profile", "-"]).profile, "-")
+        self.assertIn("$PIC_PROFILE", parser.format_help())
+
+    def test_pic_select_never_profiles_to_the_screen(self):
+        import pic_select
+
+        for value in ("-", "1"):
+            with patch.dict(os.environ, {pic_trace.ENV_VAR: value}), patch(
+                "sys.argv", ["pic_select.py", "best.txt"]
+            ), patch.object(pic_select.ImageFiles, "read"), patch.object(
+                pic_select.curses, "wrapper"
+            ), contextlib.redirect_stderr(io.StringIO()) as errors:
+                pic_select.main()
+            self.assertFalse(pic_trace.enabled())
+            self.assertIn("not profiling", errors.getvalue())
+
+    def test_import_stays_light(self):
+        code = (
+            "import sys; before = set(sys.modules); import pic_trace; "
+            "print(sorted(set(sys.modules) - before - {'pic_trace'}))"
+        )
+        bin_dir = os.path.dirname(pic_trace.__file__)
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=dict(os.environ, PYTHONPATH=bin_dir),
+        )
+        loaded = result.stdout
+        for module in ("math", "json"):
+            self.assertNotIn(f"'{module}'", loaded)
@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import benchmarks.fake_tools as fake_tools
+import benchmarks.synthlib as synthlib
+import pic_new
+import pic_watch
+
+SETTLE = 0.2
+WINDOW = 0.3
+# Generous allowance for a loaded test machine.
+SLACK = 1.0
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+class WatchTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+        self.batches = []
+        self.closed_at = {}
+        self.failing = set()
+        self.stop = threading.Event()
+
+    def tearDown(self):
+        self.stop.set()
+        self.thread.join(5)
+        self.tmp.cleanup()
+
+    def handler(self, files):
+        """Rename like pic_new would and report what was created."""
+        now = time.monotonic()
+        self.batches.append((now, [Path(f).name for f in files]))
+        if self.failing & {Path(f).name for f in files}:
+            raise subprocess.CalledProcessError(1, ["mv", "-i"])
+        created = []
+        for name in files:
+            src = Path(name)
+            dest = src.with_name("20200102-030405-" + src.stem[-4:] + ".jpg")
+            os.rename(src, dest)
+            created.append(str(dest))
+        return created
+
+    def start(self, handler=None, **kwargs):
+        kwargs.setdefault("settle", SETTLE)
+        kwargs.setdefault("batch_window", WINDOW)
+        self.thread = threading.Thread(
+            target=pic_watch.watch,
+            args=(str(self.tmpdir), handler or self.handler),
+            kwargs=dict(stop=self.stop, **kwargs),
+        )
+        self.thread.start()
+        # Let the watch get established before writing anything.
+        time.sleep(0.1)
+
+    def drop(self, name, chunks=(b"data",), pause=0.0):
+        with open(self.tmpdir / name, "wb") as f_out:
+            for chunk in chunks:
+                f_out.write(chunk)
+                f_out.flush()
+                time.sleep(pause)
+        self.closed_at[name] = time.monotonic()
+
+    def wait_for(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if sum(len(files) for _, files in self.batches) >= count:
+                return
+            time.sleep(0.02)
+        self.fail(f"only {self.batches} handled")
+
+    def test_batches_in_order_with_bounded_latency(self):
+        self.start()
+        names = [f"IMG_{i:04d}.JPG" for i in range(1, 6)]
+        for name in names:
+            self.drop(name)
+            time.sleep(0.02)
+        self.wait_for(len(names))
+        handled = [name for _, files in self.batches for name in files]
+        self.assertEqual(handled, names)
+        # Close together, so they travel as one micro-batch.
+        self.assertEqual(len(self.batches), 1)
+        for when, files in self.batches:
+            for name in files:
+                latency = when - self.closed_at[name]
+                self.assertGreaterEqual(latency, SETTLE)
+                self.assertLess(latency, SETTLE + WINDOW + SLACK)
+
+    def test_waits_for_slow_writes_and_siblings(self):
+        self.start()
+        writer = threading.Thread(
+            target=self.drop,
+            args=("IMG_0007.CR2", [b"x"] * 4),
+            kwargs={"pause": SETTLE},
+        )
+        writer.start()
+        self.drop("IMG_0007.JPG")
+        writer.join()
+        self.wait_for(1)
+        when, files = self.batches[0]
+        self.assertEqual(files, ["IMG_0007.JPG"])
+        # Not before the RAW sharing its stem was finished and settled.
+        self.assertGreaterEqual(when - self.closed_at["IMG_0007.CR2"], SETTLE)
+
+    def test_handles_each_image_once(self):
+        self.start()
+        self.drop("IMG_0001.JPG")
+        self.wait_for(1)
+        # The renamed output is ours; touching it must not re-trigger.
+        self.drop("20200102-030405-0001.jpg", [b"more"])
+        # A new card reusing the camera's name is a new image.
+        self.drop("IMG_0001.JPG", [b"new card"])
+        self.wait_for(2)
+        time.sleep(SETTLE + WINDOW + 0.2)
+        handled = [name for _, files in self.batches for name in files]
+        self.assertEqual(handled, ["IMG_0001.JPG", "IMG_0001.JPG"])
+
+    def test_max_batch_flushes_early(self):
+        self.start(batch_window=30.0, max_batch=2)
+        for name in ("IMG_0001.JPG", "IMG_0002.JPG"):
+            self.drop(name)
+        self.wait_for(2, timeout=SETTLE + SLACK + 1)
+        self.assertEqual(
+            self.batches[0][1], ["IMG_0001.JPG", "IMG_0002.JPG"]
+        )
+
+    def test_failed_batch_keeps_watching(self):
+        self.failing.add("IMG_0001.JPG")
+        self.start()
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            self.drop("IMG_0001.JPG")
+            self.wait_for(1)
+            self.drop("IMG_0002.JPG")
+            self.wait_for(2)
+        self.assertIn("IMG_0001.JPG", errors.getvalue())
+        self.assertTrue(self.thread.is_alive())
+        self.assertEqual(
+            [files for _, files in self.batches],
+            [["IMG_0001.JPG"], ["IMG_0002.JPG"]],
+        )
+        self.assertTrue((self.tmpdir / "20200102-030405-0002.jpg").exists())
+
+    def test_renames_through_pic_new(self):
+        # Not in the watched directory, where the tools would be images.
+        tools = tempfile.TemporaryDirectory()
+        self.addCleanup(tools.cleanup)
+        fake_tools.install(Path(tools.name))
+        path = os.pathsep.join([tools.name, os.environ.get("PATH", "")])
+        environ = patch.dict(os.environ, {"PATH": path})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        def rename(files):
+            self.batches.append((time.monotonic(), files))
+            with contextlib.redirect_stdout(io.StringIO()):
+                return pic_new.rename_files(files)
+
+        self.start(rename)
+        expected = []
+        for i in range(1, 4):
+            taken = datetime(2020, 1, 2, 3, 4, i)
+            exif = synthlib.build_exif(taken, 6 if i == 2 else 1)
+            self.drop(f"IMG_000{i}.CR2", [b"raw"])
+            jpeg = synthlib.encode_jpeg(16, 16, seed=i, exif=exif)
+            self.drop(f"IMG_000{i}.JPG", [jpeg])
+            base = f"{taken:%Y%m%d-%H%M%S}-000{i}"
+            expected += [f"{base}.jpg", f"{base}.cr2"]
+        self.wait_for(3)
+        # Give any (wrong) re-handling of the renamed files time to show.
+        time.sleep(SETTLE + WINDOW + 0.2)
+        handled = [Path(f).name for _, files in self.batches for f in files]
+        self.assertEqual(handled, [f"IMG_000{i}.JPG" for i in range(1, 4)])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), sorted(expected))
+        for when, files in self.batches:
+            for name in files:
+                latency = when - self.closed_at[Path(name).name]
+                self.assertLess(latency, SETTLE + WINDOW + SLACK)
+
+    def cpu_time(self):
+        """Return the CPU seconds the watch thread has used."""
+        clock = time.pthread_getcpuclockid(self.thread.ident)
+        return time.clock_gettime(clock)
+
+    def test_file_left_open_does_not_spin(self):
+        self.start(stale_after=1.0)
+        with open(self.tmpdir / "IMG_0001.CR2", "wb") as held:
+            held.write(b"raw")
+            held.flush()
+            self.drop("IMG_0001.JPG")
+            self.drop("IMG_0002.JPG")
+            self.wait_for(1)
+            # The image whose RAW is still open waits; the other does not.
+            self.assertEqual(self.batches[0][1], ["IMG_0002.JPG"])
+            with contextlib.redirect_stderr(io.StringIO()) as errors:
+                self.wait_for(2, timeout=1.0 + SETTLE + WINDOW + SLACK)
+            self.assertIn("IMG_0001.CR2 left open", errors.getvalue())
+            self.assertEqual(self.batches[1][1], ["IMG_0001.JPG"])
+            self.assertLess(self.cpu_time(), 0.2)
+
+    def test_subdirectory_does_not_spin(self):
+        self.start()
+        (self.tmpdir / "sub").mkdir()
+        os.symlink("sub", self.tmpdir / "link")
+        time.sleep(SETTLE + 0.5)
+        self.drop("IMG_0003.JPG")
+        self.wait_for(1)
+        self.assertEqual(self.batches[0][1], ["IMG_0003.JPG"])
+        self.assertLess(self.cpu_time(), 0.2)
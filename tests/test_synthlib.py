@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import benchmarks.fake_tools as fake_tools
+import benchmarks.synthlib as synthlib
+import bin.pic_new as pic_new
+
+
+class SynthLibTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_exif_round_trip_both_byte_orders(self):
+        when = datetime(2019, 8, 7, 6, 5, 4)
+        for byteorder in "<>":
+            data = synthlib.encode_jpeg(
+                16, 16, exif=synthlib.build_exif(when, 6, byteorder)
+            )
+            self.assertEqual(data[:2], b"\xff\xd8")
+            self.assertEqual(data[-2:], b"\xff\xd9")
+            tags = synthlib.read_exif(data)
+            self.assertEqual(
+                tags[synthlib.TAG_DATETIME_ORIGINAL], "2019:08:07 06:05:04"
+            )
+            self.assertEqual(tags[synthlib.TAG_ORIENTATION], 6)
+
+    def test_library_layout(self):
+        lib = synthlib.make_library(
+            self.tmpdir, 4, raw_fraction=1.0, xmp_size=2048
+        )
+        self.assertEqual(len(lib.jpegs), 4)
+        self.assertEqual(len(lib.raws), 4)
+        for sidecar in lib.sidecars:
+            self.assertTrue(sidecar.name.endswith(".CR2.xmp"))
+            self.assertGreaterEqual(sidecar.stat().st_size, 2048)
+
+    def test_fake_exiftags_feeds_pic_new(self):
+        tools = self.tmpdir / "tools"
+        fake_tools.install(tools)
+        lib = synthlib.make_library(self.tmpdir / "lib", 1, rotated_fraction=1)
+        path = os.pathsep.join([str(tools), os.environ.get("PATH", "")])
+        with patch.dict(os.environ, {"PATH": path}):
+            self.assertEqual(
+                pic_new.read_exif_datetime(lib.jpegs[0]),
+                lib.taken[lib.jpegs[0]],
+            )
+            self.assertTrue(pic_new.check_orientation(lib.jpegs[0]))